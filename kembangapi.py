@@ -1,17 +1,49 @@
-import pygame
-import random
+import os
+import sys
+import json
 import math
-from pygame.math import Vector2
+import random
+import atexit
+import argparse
+import asyncio
+import gc
+import csv
+import contextlib
+import heapq
+import ipaddress
+import queue
+import threading
+import functools
+import itertools
+import statistics
+import collections
+import multiprocessing
+import concurrent.futures
+import tracemalloc
+from time import perf_counter
+from multiprocessing import shared_memory
+
+PROCESS_START = perf_counter()  # Titik nol untuk mengukur waktu sampai frame pertama
+
+# Mode headless harus memilih driver SDL sebelum pygame diinisialisasi
+HEADLESS = __name__ == "__main__" and any(flag in sys.argv for flag in ('--headless', '--bench', '--export'))
+if HEADLESS:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'  # stdout bisa dipakai untuk --export -
 
-# --- Inisialisasi Pygame & Mixer ---
-pygame.init()
-pygame.mixer.init()
-pygame.font.init()
+import pygame
+import numpy as np
+from pygame.math import Vector2
 
 # --- Pengaturan Utama ---
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 750
-FPS = 60
+FPS = 60  # Batas kecepatan render
+SIM_RATE = 60  # Langkah simulasi per detik; umur partikel dihitung dalam langkah ini
+SIM_DT_MS = 1000 / SIM_RATE
+MAX_CATCH_UP_STEPS = 5  # Batas langkah simulasi per iterasi loop saat tertinggal
+MAX_SKIPPED_RENDERS = 3  # Batas render berturut-turut yang boleh dilewati
 WATERLINE_Y = SCREEN_HEIGHT * 0.75  # Posisi permukaan air
 
 # --- Konstanta Fisika & Efek ---
@@ -22,12 +54,60 @@ AUTO_FIREWORK_CHANCE = 0.02
 CRACKLE_CHANCE = 0.08
 NUM_CRACKLE_PARTICLES = 15
 SHOOTING_STAR_CHANCE = 0.001
+STAR_BRIGHTNESS = (40, 60, 90, 120)
+WINDOW_OFF_CHANCE = 0.0005  # Peluang per langkah lampu jendela yang menyala padam
+WINDOW_ON_CHANCE = 0.0001  # Peluang per langkah lampu yang padam menyala lagi
+RANDOM_BLOCK_SIZE = 4096  # Angka acak yang dibuat sekaligus oleh RandomStream
+TRAIL_FADE = 0.92  # Kecerahan jejak (asap roket, ekor bintang jatuh) yang tersisa per langkah
+TRAIL_FADE_FLOOR = 2  # Dikurangkan juga per langkah; BLEND_MULT membulatkan ke atas dan tak pernah mencapai 0
+SMOKE_WIDTH = 2  # Tebal garis asap roket
+SHOOTING_STAR_WIDTH = 2  # Tebal ekor bintang jatuh
+
+# --- Pengaturan Anggaran Performa ---
+PARTICLE_BUDGET = 20000  # Batas global partikel hidup
+FRAME_BUDGET_MS = 1000 / FPS * 0.8  # Sisakan waktu untuk display.flip
+MIN_DETAIL = 0.2
+DETAIL_HEADROOM = 0.7  # Detail dipulihkan bila beban di bawah ini
+DETAIL_SMOOTHING = 0.1  # Bobot EMA biaya frame
+REFLECTION_MIN_DETAIL = 0.5  # Di bawah level ini pantulan air dilewati
+CULL_MARGIN = 8  # Piksel di luar layar yang masih dianggap terlihat (radius sprite)
+
+# --- Pengaturan Simulasi Paralel ---
+SHARD_SIZE = 8192  # Jumlah percikan per shard (juga unit RNG deterministik)
+PARALLEL_MIN_SPARKS = 2 * SHARD_SIZE  # Di bawah ini overhead IPC lebih mahal
+PARALLEL_START_METHOD = None  # None = bawaan platform ('fork', 'spawn' atau 'forkserver')
 
 # --- Pengaturan Teks ---
 DEFAULT_TEXT_MESSAGE = "Ketik [T] & Enter"
 TEXT_ANIMATION_INTERVAL = 12000
 TEXT_PARTICLE_SPEED = 5
 TEXT_PARTICLE_HOLD_TIME = 240
+TEXT_CACHE_SIZE = 32  # Jumlah pesan yang koordinat partikelnya di-cache
+
+# --- Pengaturan Timeline ---
+TIMELINE_LOOKAHEAD_MS = 2000  # Cue boleh tidak berurutan di file sejauh jendela ini
+
+# --- Pengaturan Server Kontrol ---
+CONTROL_DEFAULT_PORT = 7777  # Dipakai bila --control hanya berisi host
+CONTROL_QUEUE_SIZE = 4096  # Perintah yang boleh antre; yang tertua dibuang bila penuh
+CONTROL_MAX_PER_FRAME = 64  # Perintah yang dijalankan per frame, sisanya frame berikutnya
+CONTROL_READ_SIZE = 65536  # Byte per pembacaan socket (satu batch perintah)
+CONTROL_MAX_LINE = 4096  # Baris lebih panjang dari ini ditolak tanpa ditampung
+
+# --- Pengaturan Ekspor Video ---
+EXPORT_QUEUE_SIZE = 8  # Frame yang boleh antre menunggu writer
+
+# --- Pengaturan Profiler ---
+PROFILE_WINDOW = 300  # Jumlah frame untuk statistik bergulir
+PROFILE_HUD_REFRESH = 15  # Overlay digambar ulang setiap sekian frame
+PROFILE_KEY = pygame.K_F3
+PROFILE_SCOPES = (
+    'events', 'update', 'update.background', 'update.fireworks', 'update.sparks', 'update.text',
+    'update.shooting_stars', 'update.trails', 'draw', 'draw.background', 'draw.fireworks', 'draw.sparks',
+    'draw.reflection', 'draw.text', 'draw.ui', 'audio', 'control', 'hud', 'flip',
+)
+PROFILE_COUNTERS = ('sparks', 'text', 'shooting_stars', 'fireworks', 'sub_explosions',
+                    'allocations', 'gc_collections', 'commands')
 
 # --- Pengaturan Grand Finale ---
 FINALE_DURATION = 15000  # 15 detik
@@ -38,52 +118,430 @@ BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 GRAY = (128, 128, 128)
 GOLD = (255, 215, 0)
+SKY_COLOR = (0, 0, 8)
 CITY_COLOR = (15, 15, 25)
+COLORKEY = (255, 0, 255)  # Warna transparan untuk lapisan kota
 WATER_OVERLAY_COLOR = (5, 10, 20, 120)
 HEART_COLORS = [(255, 20, 147), (255, 105, 180), (255, 182, 193)]
 
-# --- Setup Layar & Font ---
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Kembang Api v5 | [M]ulti | [H]ati | [F]inale")
-clock = pygame.time.Clock()
-try:
-    MESSAGE_FONT = pygame.font.SysFont("segoeuisemibold", 72)
-    HELP_FONT = pygame.font.SysFont("segoeuisemibold", 18)
-    INPUT_FONT = pygame.font.SysFont("segoeuisemibold", 36)
-except:
-    MESSAGE_FONT = pygame.font.SysFont("arial", 72)
-    HELP_FONT = pygame.font.SysFont("arial", 18)
-    INPUT_FONT = pygame.font.SysFont("arial", 36)
-
-# --- Memuat Suara (Placeholder) ---
-try:
-    launch_sound = pygame.mixer.Sound('launch.wav')
-    explode_sound = pygame.mixer.Sound('explode.wav')
-    crackle_sound = pygame.mixer.Sound('crackle.wav')
-    launch_sound.set_volume(0.4)
-    explode_sound.set_volume(0.5)
-    crackle_sound.set_volume(0.3)
-except (pygame.error, FileNotFoundError):
-    class DummySound:
-        def play(self): pass
-    launch_sound = explode_sound = crackle_sound = DummySound()
-    print("Warning: File suara tidak ditemukan. Program akan berjalan tanpa suara.")
+# --- Pengaturan Mode Render ---
+RENDER_MODES = ('sharp', 'glow')
+RENDER_MODE = 'sharp'  # 'glow' = percikan di lapisan aditif beresolusi rendah (GlowLayer)
+GLOW_SCALE = 2  # Lapisan glow = layar / GLOW_SCALE; 2 = 4x lebih sedikit piksel, 4 = 16x
+GLOW_BLOOM = 0.5  # Kekuatan bloom yang ditambahkan (0 = tanpa bloom)
+GLOW_BLUR = 4  # Radius blur bloom, dalam piksel buffer glow
+GLOW_MAX_GAIN = 2.0  # Batas kecerahan satu titik glow relatif warnanya (di atas 1 mulai memutih)
+
+# --- Pengaturan Pantulan Air ---
+REFLECTION_SQUASH = 0.5  # Tinggi pantulan dibanding tinggi langit yang dicerminkan
+REFLECTION_DIM = 0.4  # Kecerahan pantulan relatif terhadap aslinya
+RIPPLE_AMPLITUDE = 4  # Geseran horizontal maksimum riak (piksel)
+RIPPLE_SPEED = 300  # ms per radian
+WATER_FRAMES = 16  # Jumlah frame siklus garis riak di latar air
+
+# --- Layar, Font & Suara (dibuat saat dibutuhkan) ---
+# Mengimpor modul ini tidak membuka jendela, memuat font, atau menyentuh audio;
+# semuanya dibuat pertama kali dipakai agar start cepat dan modul bisa diimpor alat lain.
+WINDOW_CAPTION = "Kembang Api v5 | [M]ulti | [H]ati | [F]inale"
+FONT_NAMES = ("segoeuisemibold", "arial")  # Dicoba berurutan, lalu font bawaan pygame
+FONT_SIZES = {'message': 72, 'help': 18, 'input': 36}
+FONT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'kembangapi', 'fonts.json')
+SOUND_FILES = {'launch': ('launch.wav', 0.4), 'explode': ('explode.wav', 0.5), 'crackle': ('crackle.wav', 0.3)}
+AUDIO_VOICES = 12  # Channel mixer tetap untuk semua efek suara
+AUDIO_MAX_PER_FRAME = {'launch': 2, 'explode': 3, 'crackle': 2}  # Voice baru per jenis per frame
+AUDIO_PRIORITY = ('explode', 'launch', 'crackle')  # Urutan flush; yang terakhir tidak boleh mencuri voice
+AUDIO_COALESCE_GAIN = 0.25  # Tambahan volume per kelipatan dua event yang digabung
+
+screen = None  # Diisi init_display()
+
+
+def init_display():
+    """Membuka jendela sekali saja dan mengembalikan surface-nya."""
+    global screen
+    if screen is None:
+        pygame.display.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption(WINDOW_CAPTION)
+    return screen
+
+
+def resolve_font_path(names=FONT_NAMES, cache_path=FONT_CACHE_PATH):
+    """Path font pertama dari `names` yang terpasang, atau None untuk font bawaan.
+
+    pygame.font.match_font memindai direktori font sistem, yang lambat
+    justru saat fontnya tidak ada. Hasilnya (termasuk None) disimpan di
+    cache_path dan dipakai lagi di run berikutnya; hapus file itu setelah
+    memasang font baru.
+    """
+    key = '|'.join(names)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache and (cache[key] is None or os.path.exists(cache[key])):
+        return cache[key]
+    path = next(filter(None, map(pygame.font.match_font, names)), None)
+    cache[key] = path
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f)
+    except OSError:
+        pass  # Cache hanya optimasi
+    return path
+
+
+class FontSet:
+    """Font pertunjukan (FONTS.message, .help, .input), dimuat saat pertama diakses."""
+
+    def __init__(self, sizes=FONT_SIZES):
+        self.sizes = sizes
+        self._lock = threading.Lock()  # Bisa diakses dari thread pemanasan cache
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self.sizes:
+            raise AttributeError(name)
+        with self._lock:
+            font = self.__dict__.get(name)
+            if font is None:
+                if not pygame.font.get_init():
+                    pygame.font.init()
+                if 'path' not in self.__dict__:
+                    self.path = resolve_font_path()
+                # Disimpan sebagai atribut biasa: akses berikutnya tidak lewat __getattr__
+                font = self.__dict__[name] = pygame.font.Font(self.path, self.sizes[name])
+        return font
+
+
+class SoundBank:
+    """Penjadwal efek suara dengan kumpulan voice tetap.
+
+    Event dicatat lewat trigger() lalu dimainkan sekali per frame oleh flush():
+    tiap jenis suara dibatasi AUDIO_MAX_PER_FRAME voice, event berlebih digabung
+    jadi satu play yang lebih keras, dan pan/volume mengikuti posisi x ledakan.
+    Sebelum load() selesai (mis. masih di thread latar) trigger() tidak berbuat apa-apa.
+    """
+
+    def __init__(self, files=SOUND_FILES, voices=AUDIO_VOICES):
+        self.files = files
+        self.num_voices = voices
+        self.loaded = False
+        self.sounds = {}
+        self.voices = []
+        self.next_steal = 0
+        self.pending = {name: [] for name in files}
+        self.triggered = self.played = self.dropped = 0
+
+    def load(self):
+        try:
+            pygame.mixer.init()
+            sounds = {name: pygame.mixer.Sound(path) for name, (path, _) in self.files.items()}
+        except (pygame.error, FileNotFoundError):
+            print("Warning: File suara tidak ditemukan. Program akan berjalan tanpa suara.", file=sys.stderr)
+            return
+        # Voice dipakai eksklusif oleh penjadwal; volume diatur per channel saat play
+        pygame.mixer.set_num_channels(self.num_voices)
+        self.voices = [pygame.mixer.Channel(i) for i in range(self.num_voices)]
+        self.sounds = sounds
+        self.loaded = True
+
+    def trigger(self, name, x=SCREEN_WIDTH / 2):
+        """Mencatat satu event suara di posisi x; baru dimainkan saat flush()."""
+        if self.loaded:
+            self.pending[name].append(x)
+
+    def flush(self):
+        """Memainkan event frame ini, paling penting lebih dulu."""
+        if not self.loaded:
+            return
+        for name in AUDIO_PRIORITY:
+            xs = self.pending[name]
+            if not xs:
+                continue
+            self.triggered += len(xs)
+            xs.sort()
+            # Event terurut dibagi rata jadi beberapa kelompok; tiap kelompok satu voice
+            groups = min(len(xs), AUDIO_MAX_PER_FRAME[name])
+            for i in range(groups):
+                group = xs[i * len(xs) // groups:(i + 1) * len(xs) // groups]
+                self._play(name, statistics.fmean(group), len(group), steal=name != AUDIO_PRIORITY[-1])
+            xs.clear()
+
+    def _play(self, name, x, count, steal):
+        voice = next((v for v in self.voices if not v.get_busy()), None)
+        if voice is None:
+            if not steal:
+                self.dropped += count
+                return
+            voice = self.voices[self.next_steal]
+            self.next_steal = (self.next_steal + 1) % len(self.voices)
+        # Gabungan naik logaritmik: 8 crackle sekaligus = 1.75x, bukan 8x (clipping)
+        volume = min(1.0, self.files[name][1] * (1 + AUDIO_COALESCE_GAIN * math.log2(count)))
+        pan = min(max(x / SCREEN_WIDTH, 0.0), 1.0)
+        voice.play(self.sounds[name])
+        # Pan linear: tengah = volume penuh di kedua sisi; harus setelah play() karena play() mereset volume
+        voice.set_volume(volume * min(1.0, 2 * (1 - pan)), volume * min(1.0, 2 * pan))
+        self.played += 1
+
+    def stats(self):
+        return {'triggered': self.triggered, 'played': self.played, 'dropped': self.dropped}
+
+
+FONTS = FontSet()
+AUDIO = SoundBank()
+
+
+# --- Bilangan Acak ---
+RNG = np.random.default_rng()  # Untuk kode vektor simulasi (template ledakan, palet crackle)
+
+
+class RandomStream:
+    """Sumber angka acak skalar untuk simulasi, diisi per blok NumPy.
+
+    RANDOM_BLOCK_SIZE angka uniform [0, 1) dibuat sekaligus lalu dibagikan
+    satu per satu sebagai float Python. Semua keputusan acak simulasi lewat
+    sini (atau lewat RNG untuk array), jadi seed() yang sama mengulang run
+    yang sama persis. Untuk efek yang jarang terjadi lebih murah mengambil
+    waktu kejadian berikutnya dengan steps_until() daripada melempar dadu
+    setiap langkah.
+    """
+
+    def __init__(self, seed=None, block_size=RANDOM_BLOCK_SIZE):
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self._next = iter(()).__next__
+
+    def random(self):
+        try:
+            return self._next()
+        except StopIteration:
+            self._next = iter(self.rng.random(self.block_size).tolist()).__next__
+            return self._next()
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def randint(self, a, b):
+        """Bilangan bulat a <= n <= b, seperti random.randint."""
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def choices(self, values, n):
+        """Array `n` pilihan acak dari `values`, langsung dari generator NumPy."""
+        return self.rng.choice(values, n)
+
+    def steps_until(self, chance):
+        """Jumlah langkah sampai event berpeluang `chance` per langkah terjadi.
+
+        Sampel distribusi geometrik, jadi hasilnya setara dengan melempar
+        dadu `random() < chance` setiap langkah sampai berhasil.
+        """
+        return 1 + int(math.log(1.0 - self.random()) / math.log1p(-chance))
+
+
+RANDOM = RandomStream()
+# Keacakan yang hanya mengubah tampilan (kelip glitter). Jumlah render berbeda
+# antar mesin (FixedTimestep melewati render), jadi tidak boleh memakai RANDOM/RNG.
+RENDER_RANDOM = RandomStream()
+
+
+# --- Cache Sprite Partikel ---
+ALPHA_STEP = 8  # Lebar satu bucket alpha
+COLOR_STEP = 16  # Kuantisasi tiap kanal warna sprite
+SPRITE_CACHE_SIZE = 16384
+
+
+class SpriteCache:
+    """Cache sprite lingkaran ber-alpha dengan eviksi LRU.
+
+    Sprite dikunci oleh (diameter dalam piksel, warna terkuantisasi, bucket
+    alpha) sehingga partikel tidak perlu membuat Surface baru setiap kali
+    digambar.
+    """
+
+    def __init__(self, max_size=SPRITE_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = self.misses = 0
+        self._sprites = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def clear(self):
+        self._sprites.clear()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def alpha_bucket(alpha):
+        return (alpha + ALPHA_STEP // 2) // ALPHA_STEP
+
+    @staticmethod
+    def quantize_color(channel):
+        return np.minimum(255, (channel + COLOR_STEP // 2) // COLOR_STEP * COLOR_STEP)
+
+    def get(self, size, color, alpha):
+        """Sprite untuk satu partikel berjari-jari `size`, atau None bila tak terlihat.
+
+        Jalur ini dipakai roket (Particle) yang warnanya konstanta, jadi
+        warnanya tidak perlu dikuantisasi.
+        """
+        bucket = (int(alpha) + ALPHA_STEP // 2) // ALPHA_STEP
+        if size < 1 or bucket <= 0:
+            return None
+        return self.get_quantized(int(size * 2), color, bucket)
+
+    def get_quantized(self, diameter, color, bucket):
+        key = (diameter, color, bucket)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self._sprites.move_to_end(key)
+            return sprite
+        self.misses += 1
+        radius = diameter / 2
+        sprite = pygame.Surface((diameter, diameter), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, (*color, min(255, bucket * ALPHA_STEP)),
+                           (radius, radius), radius)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_size:
+            self._sprites.popitem(last=False)
+        return sprite
+
+
+SPRITES = SpriteCache()
+
+
+def blit_batch(surface, blit_sequence):
+    """Menggambar banyak (sprite, posisi) sekaligus, memakai fblits bila tersedia.
+
+    `blit_sequence` sebaiknya iterator (mis. zip) agar tuple per partikel
+    langsung dibebaskan dan tidak menumpuk di generasi muda GC.
+    """
+    fblits = getattr(surface, 'fblits', None)
+    if fblits is not None:
+        fblits(blit_sequence)
+    else:
+        surface.blits(blit_sequence, doreturn=False)
+
+
+def update_and_sweep(items):
+    """Meng-update setiap entitas sekali, lalu membuang yang mati dengan swap-remove.
+
+    Entitas yang mati dikembalikan ke pool-nya dan diganti entitas terakhir di
+    list (urutan tidak dijaga), sehingga tidak ada list baru yang dibangun.
+    """
+    i = 0
+    while i < len(items):
+        item = items[i]
+        item.update()
+        if item.is_alive():
+            i += 1
+        else:
+            item.release()
+            last = items.pop()
+            if i < len(items):
+                items[i] = last
+
+
+# --- Pooling Objek & Statistik GC ---
+class ObjectPool:
+    """Free list untuk objek berumur pendek (Firework, ShootingStar).
+
+    acquire() memakai ulang objek dari free list lewat reset(), dan hanya
+    membuat objek baru bila free list kosong. release() mengembalikannya.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.allocated = self.reused = 0
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            self.reused += 1
+        else:
+            obj = self.cls(*args, **kwargs)
+            self.allocated += 1
+        return obj
+
+    def release(self, obj):
+        self.free.append(obj)
+
+    def clear(self):
+        self.free.clear()
+        self.allocated = self.reused = 0
+
+    def stats(self):
+        return {'allocated': self.allocated, 'reused': self.reused, 'free': len(self.free)}
+
+
+class GCMonitor:
+    """Mencatat jumlah dan lama jeda garbage collector lewat gc.callbacks."""
+
+    def __init__(self):
+        self._start = None
+        self.reset()
+
+    def install(self):
+        if self._callback not in gc.callbacks:
+            gc.callbacks.append(self._callback)
+
+    def reset(self):
+        self.collections = 0
+        self.total_ms = self.max_ms = 0.0
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._start = perf_counter()
+        elif self._start is not None:
+            pause = (perf_counter() - self._start) * 1000
+            self._start = None
+            self.collections += 1
+            self.total_ms += pause
+            self.max_ms = max(self.max_ms, pause)
+
+    def stats(self):
+        return {'collections': self.collections, 'pause_ms_total': self.total_ms,
+                'pause_ms_max': self.max_ms}
+
+
+GC_MONITOR = GCMonitor()
 
 
 class Particle:
-    """Kelas partikel yang disempurnakan dengan state dan fisika yang lebih baik."""
+    """Kelas partikel yang disempurnakan dengan state dan fisika yang lebih baik.
+
+    Kini hanya dipakai untuk roket; satu per Firework dan ikut dipakai ulang
+    bersama pool Firework. Percikan ledakan ada di SPARKS.
+    """
 
-    def __init__(self, pos, vel, color, size, lifespan, has_gravity=True, can_crackle=False, is_reflection=False, state='burning'):
-        self.pos = Vector2(pos)
-        self.vel = Vector2(vel)
+    __slots__ = ('pos', 'prev_pos', 'vel', 'color', 'size', 'lifespan', 'initial_lifespan',
+                 'has_gravity', 'can_crackle', 'state')
+
+    def __init__(self, *args, **kwargs):
+        self.pos = Vector2()
+        self.prev_pos = Vector2()
+        self.vel = Vector2()
+        self.reset(*args, **kwargs)
+
+    def reset(self, pos, vel, color, size, lifespan, has_gravity=True, can_crackle=False, state='burning'):
+        self.pos.update(pos)
+        self.prev_pos.update(pos)
+        self.vel.update(vel)
         self.color = color
         self.size = size
         self.lifespan = lifespan
         self.initial_lifespan = lifespan
         self.has_gravity = has_gravity
         self.can_crackle = can_crackle
-        self.crackled = False
-        self.is_reflection = is_reflection
         self.state = state  # 'burning', 'fading', 'glitter'
 
     def update(self):
@@ -91,6 +549,7 @@ class Particle:
             return
 
         self.lifespan -= 1
+        self.prev_pos.update(self.pos)
         self.pos += self.vel
 
         if self.has_gravity:
@@ -106,297 +565,869 @@ class Particle:
         # Transisi state partikel untuk efek visual yang lebih baik
         if self.lifespan < self.initial_lifespan * 0.2 and self.state == 'burning':
             self.state = 'fading'
-            if random.random() < 0.2:  # Peluang menjadi glitter
+            if RANDOM.random() < 0.2:  # Peluang menjadi glitter
                 self.state = 'glitter'
                 # Perpanjang sedikit umur untuk jatuh
                 self.lifespan = self.initial_lifespan * 0.6
 
-    def draw(self, surface):
+    def sprite_blit(self, alpha=1.0):
+        """Mengembalikan (sprite, posisi) untuk digambar, atau None.
+
+        `alpha` adalah fraksi langkah simulasi yang sudah lewat; posisi
+        diinterpolasi antara langkah sebelumnya dan langkah terakhir.
+        """
         if not self.is_alive():
-            return
+            return None
 
-        alpha_multiplier = 0.4 if self.is_reflection else 1.0
         current_size = self.size
 
         if self.state == 'glitter':
             # Efek berkelip untuk glitter
-            alpha = max(0, int(random.choice(
-                [150, 200, 255]) * alpha_multiplier))
+            opacity = RENDER_RANDOM.choice((150, 200, 255))
             current_size *= 0.8
         else:
-            alpha = max(
-                0, int(255 * (self.lifespan / self.initial_lifespan)**1.2 * alpha_multiplier))
+            opacity = max(
+                0, int(255 * (self.lifespan / self.initial_lifespan)**1.2))
+
+        sprite = SPRITES.get(current_size, self.color, opacity)
+        if sprite is None:
+            return None
+        half = sprite.get_width() / 2
+        pos = self.pos if alpha >= 1 else self.prev_pos.lerp(self.pos, alpha)
+        if not (-half < pos.x < SCREEN_WIDTH + half and -half < pos.y < SCREEN_HEIGHT + half):
+            return None
+        return sprite, (pos.x - half, pos.y - half)
+
+    def draw(self, surface, alpha=1.0):
+        blit = self.sprite_blit(alpha)
+        if blit:
+            surface.blit(*blit)
 
-        if self.is_reflection:
-            current_size *= 0.7
-            if self.pos.y < WATERLINE_Y:
-                self.lifespan = 0
+    def is_alive(self):
+        return self.lifespan > 0
 
-        if current_size < 1:
-            return
 
-        particle_surf = pygame.Surface(
-            (current_size * 2, current_size * 2), pygame.SRCALPHA)
-        pygame.draw.circle(particle_surf, (*self.color, alpha),
-                           (current_size, current_size), current_size)
-        surface.blit(particle_surf, (self.pos.x -
-                     current_size, self.pos.y - current_size))
+class TextParticleField:
+    """Semua partikel teks sebuah pesan dalam satu set array NumPy.
 
-    def is_alive(self):
-        return self.lifespan > 0
+    Setiap partikel terbang dari tengah layar ke titik targetnya, diam selama
+    TEXT_PARTICLE_HOLD_TIME frame, lalu jatuh dengan gravitasi. Ketiga fase
+    dihitung sekaligus untuk semua partikel.
+    """
+
+    MOVING, HOLDING, FALLING = 0, 1, 2
 
+    def __init__(self, targets):
+        n = len(targets)
+        self.target = np.array(targets, dtype=np.float64).reshape(n, 2)
+        self.pos = np.tile((SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2), (n, 1)).astype(np.float64)
+        self.prev_pos = self.pos.copy()
+        self.vel = np.zeros((n, 2))
+        self.state = np.full(n, self.MOVING, dtype=np.int8)
+        self.hold_timer = np.full(n, TEXT_PARTICLE_HOLD_TIME, dtype=np.int64)
+        self.lifespan = np.full(n, 500.0)
 
-class TextParticle(Particle):
-    # ... (Kelas ini sebagian besar tetap, hanya mewarisi Particle yang baru)
-    def __init__(self, target_pos):
-        start_pos = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-        super().__init__(start_pos, (0, 0), GOLD, 2,
-                         500, has_gravity=False, state='holding')
-        self.target_pos = Vector2(target_pos)
-        self.state = 'moving_to_target'  # State awal yang baru
-        self.hold_timer = TEXT_PARTICLE_HOLD_TIME
+    def __len__(self):
+        return len(self.state)
 
     def update(self):
-        if self.state == 'moving_to_target':
-            direction = (self.target_pos - self.pos)
-            if direction.length() < 5:
-                self.pos = self.target_pos
-                self.vel = Vector2(0, 0)
-                self.state = 'holding'
-            else:
-                self.vel = direction.normalize() * TEXT_PARTICLE_SPEED
-                self.pos += self.vel
-        elif self.state == 'holding':
-            self.hold_timer -= 1
-            if self.hold_timer <= 0:
-                self.state = 'falling'
-                self.has_gravity = True
-        elif self.state == 'falling':
-            super().update()
-            self.lifespan -= 1.5
+        if not len(self):
+            return
+        np.copyto(self.prev_pos, self.pos)
+        # Fase diambil sebelum ada transisi: satu partikel hanya menjalani satu fase per frame
+        moving = np.flatnonzero(self.state == self.MOVING)
+        holding = np.flatnonzero(self.state == self.HOLDING)
+        falling = np.flatnonzero(self.state == self.FALLING)
+        if moving.size:
+            direction = self.target[moving] - self.pos[moving]
+            distance = np.hypot(direction[:, 0], direction[:, 1])
+            arrived = distance < 5
+            done, going = moving[arrived], moving[~arrived]
+            self.pos[done] = self.target[done]
+            self.vel[done] = 0
+            self.state[done] = self.HOLDING
+            self.vel[going] = direction[~arrived] / distance[~arrived, None] * TEXT_PARTICLE_SPEED
+            self.pos[going] += self.vel[going]
+
+        if holding.size:
+            self.hold_timer[holding] -= 1
+            self.state[holding[self.hold_timer[holding] <= 0]] = self.FALLING
+
+        if falling.size:
+            # Sama dengan Particle.update dengan gravitasi, ditambah umur -1.5
+            self.lifespan[falling] -= 2.5
+            self.pos[falling] += self.vel[falling]
+            self.vel[falling] += GRAVITY_XY + WIND_XY
+
+        alive = (self.pos[:, 1] < SCREEN_HEIGHT + 20) & (self.lifespan > 0)
+        if not alive.all():
+            for name in ('target', 'pos', 'prev_pos', 'vel', 'state', 'hold_timer', 'lifespan'):
+                setattr(self, name, getattr(self, name)[alive])
+
+    def draw(self, surface, alpha=1.0):
+        if not len(self):
+            return
+        pos = self.pos if alpha >= 1 else self.prev_pos + (self.pos - self.prev_pos) * alpha
+        falling = self.state == self.FALLING
+        opacity = np.where(falling, np.clip(255 * (self.lifespan / 100), 0, 255), 255).astype(np.int64)
+        size = np.where(self.state == self.HOLDING, 2, 1.5)
+        diameters = (size * 2).astype(np.int64)
+        buckets = SpriteCache.alpha_bucket(opacity)
+        visible = np.flatnonzero(buckets > 0)
+        keys = diameters[visible] << 8 | buckets[visible]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sprites = [SPRITES.get_quantized(k >> 8, GOLD, k & 255) for k in unique_keys.tolist()]
+        corners = pos[visible] - size[visible, None]
+        blit_batch(surface, zip(map(sprites.__getitem__, inverse.tolist()),
+                                zip(corners[:, 0].tolist(), corners[:, 1].tolist())))
+
+
+# --- Mesin Partikel Berbasis Array ---
+STATE_BURNING, STATE_FADING, STATE_GLITTER, STATE_COMET = 0, 1, 2, 3
+GLITTER_ALPHAS = np.array([150, 200, 255])
+GRAVITY_XY = np.array((GRAVITY.x, GRAVITY.y))
+WIND_XY = np.array((WIND.x, WIND.y))
+WIND_X_RANGE = (min(0, WIND.x, WIND.x * 1.5), max(0, WIND.x, WIND.x * 1.5))  # Batas percepatan x
+
+
+def integrate_sparks(columns, lo, hi, rng):
+    """Satu langkah fisika untuk percikan [lo, hi), sama seperti Particle.update.
+
+    Percikan yang pecah (crackle) ditandai di kolom 'crackled' dan umurnya
+    dinolkan; pemanggil yang meneruskan event-nya ke pemilik. Fungsi ini
+    hanya menyentuh array, sehingga bisa dijalankan di proses worker.
+    """
+    pos, vel, state = columns['pos'][lo:hi], columns['vel'][lo:hi], columns['state'][lo:hi]
+    life, initial = columns['lifespan'][lo:hi], columns['initial_lifespan'][lo:hi]
+    has_gravity, can_crackle = columns['has_gravity'][lo:hi], columns['can_crackle'][lo:hi]
+
+    life -= 1
+    columns['prev_pos'][lo:hi] = pos
+    pos += vel
+
+    # Glitter jatuh lebih lambat dan lebih terpengaruh angin
+    glitter = state == STATE_GLITTER
+    drag = has_gravity & glitter
+    pull = has_gravity & ~glitter
+    if drag.any():
+        vel[drag] *= 0.96
+        vel[drag] += GRAVITY_XY * 0.5 + WIND_XY * 1.5
+    if pull.any():
+        vel[pull] += GRAVITY_XY + WIND_XY
+
+    # Buang percikan yang tidak mungkin kembali ke layar dalam sisa umurnya.
+    # Gravitasi hanya menambah vy dan angin hanya mendorong ke satu arah,
+    # sedangkan hambatan glitter hanya memperkecil kecepatan, jadi batas ini
+    # aman. Sisa umur percikan 'burning' termasuk perpanjangan glitter.
+    remaining = life + np.where(state == STATE_BURNING, initial * 0.6, 0)
+    x, y, vx, vy = pos[:, 0], pos[:, 1], vel[:, 0], vel[:, 1]
+    drift = 0.5 * remaining * remaining
+    escaped = ((y + remaining * np.minimum(vy, 0) > SCREEN_HEIGHT + CULL_MARGIN)
+               | (y + remaining * np.maximum(vy, 0) + drift * has_gravity * GRAVITY_XY[1] < -CULL_MARGIN)
+               | (x + remaining * np.maximum(vx, 0) + drift * WIND_X_RANGE[1] < -CULL_MARGIN)
+               | (x + remaining * np.minimum(vx, 0) + drift * WIND_X_RANGE[0] > SCREEN_WIDTH + CULL_MARGIN))
+    # Komet tetap dibiarkan habis karena ledakan susulannya bisa masuk layar.
+    # Yang dibuang tidak boleh ikut transisi di bawah: glitter akan
+    # memperpanjang umurnya lagi dan crackle memicu ledakan di luar layar.
+    culled = escaped & (state != STATE_COMET)
+    life[culled] = 0
+
+    fading = np.flatnonzero((life < initial * 0.2) & (state == STATE_BURNING) & ~culled)
+    if fading.size:
+        state[fading] = STATE_FADING
+        to_glitter = fading[rng.random(fading.size) < 0.2]
+        state[to_glitter] = STATE_GLITTER
+        life[to_glitter] = initial[to_glitter] * 0.6
+
+    crackles = np.flatnonzero(can_crackle & (life < initial * 0.4) & ~culled)
+    crackles = crackles[rng.random(crackles.size) < CRACKLE_CHANCE]
+    can_crackle[crackles] = False
+    columns['crackled'][lo:hi][crackles] = True
+    life[crackles] = 0
+
+
+class ParticlePool:
+    """Kumpulan percikan ledakan dalam bentuk structure-of-arrays.
+
+    Posisi, kecepatan, umur, state dan warna semua percikan disimpan dalam
+    kolom NumPy yang bersebelahan, lalu di-update sekaligus setiap frame
+    dengan fisika yang sama seperti Particle.update. Setiap percikan mencatat
+    pemiliknya (Firework) agar crackle dan ledakan komet bisa diteruskan.
+    """
+
+    COLUMNS = {
+        'pos': ((2,), np.float64),
+        'prev_pos': ((2,), np.float64),  # Posisi langkah sebelumnya, untuk interpolasi render
+        'vel': ((2,), np.float64),
+        'lifespan': ((), np.float64),
+        'initial_lifespan': ((), np.float64),
+        'size': ((), np.float64),
+        'color': ((3,), np.uint8),
+        'state': ((), np.int8),
+        'has_gravity': ((), np.bool_),
+        'can_crackle': ((), np.bool_),
+        'crackled': ((), np.bool_),
+        'owner': ((), np.int64),
+    }
+
+    def __init__(self, capacity=4096, backend=None):
+        self.count = 0
+        self.capacity = 0
+        self.owners = {}
+        self.seed = int(RNG.integers(2**32))
+        self.frame = 0
+        self.backend = backend
+        self.shm = None
+        self._allocate(capacity)
+
+    @classmethod
+    def _layout(cls, capacity):
+        """Offset byte tiap kolom bila semua kolom disimpan dalam satu buffer."""
+        offsets, nbytes = {}, 0
+        for name, (shape, dtype) in cls.COLUMNS.items():
+            nbytes = -(-nbytes // 8) * 8  # Rata 8 byte
+            offsets[name] = nbytes
+            nbytes += capacity * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        return offsets, max(nbytes, 1)
+
+    @classmethod
+    def column_views(cls, buffer, capacity):
+        offsets, _ = cls._layout(capacity)
+        return {name: np.ndarray((capacity, *shape), dtype=dtype, buffer=buffer, offset=offsets[name])
+                for name, (shape, dtype) in cls.COLUMNS.items()}
+
+    def columns(self):
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def _allocate(self, capacity):
+        """(Re)alokasi kolom; di shared memory bila ada backend paralel."""
+        old, old_shm = (self.columns() if self.capacity else None), self.shm
+        if self.backend is not None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self._layout(capacity)[1])
+            columns = self.column_views(self.shm.buf, capacity)
+        else:
+            self.shm = None
+            columns = {name: np.zeros((capacity, *shape), dtype=dtype)
+                       for name, (shape, dtype) in self.COLUMNS.items()}
+        for name, column in columns.items():
+            if old is not None:
+                column[:self.count] = old[name][:self.count]
+            setattr(self, name, column)
+        self.capacity = capacity
+        if old_shm is not None:
+            del old
+            old_shm.close()
+            old_shm.unlink()
+
+    def set_backend(self, backend):
+        """Memasang (atau melepas, dengan None) backend simulasi paralel."""
+        self.backend = backend
+        self._allocate(self.capacity)
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.shutdown()
+            self.set_backend(None)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.frame = 0
+        self.owners.clear()
+
+    def spawn(self, owner, pos, vel, color, size, lifespan, state=STATE_BURNING,
+              has_gravity=True, can_crackle=False):
+        """Menambahkan len(vel) percikan milik `owner` yang berangkat dari `pos`."""
+        n = len(vel)
+        if n == 0:
+            return
+        if self.count + n > self.capacity:
+            self._allocate(max(self.capacity * 2, self.count + n))
+        s = slice(self.count, self.count + n)
+        self.pos[s] = pos
+        self.prev_pos[s] = pos
+        self.vel[s] = vel
+        self.color[s] = color
+        self.size[s] = size
+        self.lifespan[s] = lifespan
+        self.initial_lifespan[s] = self.lifespan[s]
+        self.state[s] = state
+        self.has_gravity[s] = has_gravity
+        self.can_crackle[s] = can_crackle
+        self.crackled[s] = False
+        self.owner[s] = owner.id
+        self.count += n
+        self.owners[owner.id] = owner
+        owner.spark_count += n
+
+    def integrate_shards(self, shards):
+        """Meng-update shard (lo, hi, nomor) di proses ini untuk frame sekarang."""
+        columns = self.columns()
+        for lo, hi, shard in shards:
+            integrate_sparks(columns, lo, hi, np.random.default_rng((self.seed, self.frame, shard)))
 
-    def draw(self, surface):
-        if self.lifespan > 0:
-            alpha = 255
-            if self.state == 'falling':
-                alpha = int(max(0, min(255, 255 * (self.lifespan / 100))))
-            size = 2 if self.state == 'holding' else 1.5
-            color_with_alpha = (*self.color, alpha)
-            p_surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
-            pygame.draw.circle(p_surf, color_with_alpha, (size, size), size)
-            surface.blit(p_surf, (self.pos.x - size, self.pos.y - size))
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        self.frame += 1
+        # Shard berukuran tetap dengan RNG sendiri, jadi hasilnya sama dengan
+        # atau tanpa backend paralel, berapa pun jumlah worker-nya
+        shards = [(lo, min(lo + SHARD_SIZE, n), i) for i, lo in enumerate(range(0, n, SHARD_SIZE))]
+        if not (self.backend is not None and n >= PARALLEL_MIN_SPARKS
+                and self.backend.integrate(self, shards)):
+            self.integrate_shards(shards)
+
+        pos = self.pos[:n]
+        crackles = np.flatnonzero(self.crackled[:n])
+        comets = np.flatnonzero((self.state[:n] == STATE_COMET) & (self.lifespan[:n] <= 0))
+        events = [(self.owners[o].on_crackle, p)
+                  for o, p in zip(self.owner[crackles].tolist(), pos[crackles].tolist())]
+        events += [(self.owners[o].on_comet_burst, p)
+                   for o, p in zip(self.owner[comets].tolist(), pos[comets].tolist())]
+        self._compact()
+        for handler, p in events:
+            handler(p)
+
+    def _compact(self):
+        """Membuang percikan mati dengan swap-remove dan mengurangi hitungan pemiliknya.
+
+        Lubang di bagian depan diisi percikan hidup dari ekor array, jadi
+        biayanya sebanding dengan jumlah yang mati, bukan jumlah total.
+        """
+        n = self.count
+        dead = np.flatnonzero(self.lifespan[:n] <= 0)
+        if dead.size == 0:
+            return
+        dead_owners, counts = np.unique(self.owner[dead], return_counts=True)
+        for oid, c in zip(dead_owners.tolist(), counts.tolist()):
+            owner = self.owners[oid]
+            owner.spark_count -= c
+            if owner.spark_count == 0:
+                del self.owners[oid]
+        alive = n - dead.size
+        holes = dead[dead < alive]
+        movers = alive + np.flatnonzero(self.lifespan[alive:n] > 0)
+        if holes.size:
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[holes] = column[movers]
+        self.count = alive
+
+    def _appearance(self, alpha):
+        """Posisi terinterpolasi, opacity (0..255) dan jari-jari gambar tiap percikan."""
+        n = self.count
+        pos, state = self.pos[:n], self.state[:n]
+        if alpha < 1:
+            pos = self.prev_pos[:n] + (pos - self.prev_pos[:n]) * alpha
+        life, initial = self.lifespan[:n], self.initial_lifespan[:n]
+
+        glitter = state == STATE_GLITTER
+        opacity = 255 * (life / initial) ** 1.2
+        # Efek berkelip untuk glitter
+        opacity[glitter] = RENDER_RANDOM.choices(GLITTER_ALPHAS, int(glitter.sum()))
+        return pos, np.maximum(0, opacity), self.size[:n] * np.where(glitter, 0.8, 1.0)
+
+    def draw(self, surface, alpha=1.0):
+        n = self.count
+        if n == 0:
+            return
+        pos, opacity, sizes = self._appearance(alpha)
+        opacity = opacity.astype(np.int64)
+
+        # Kunci sprite dikemas jadi satu integer agar cukup satu lookup per kunci unik
+        diameters = (sizes * 2).astype(np.int64)
+        buckets = SpriteCache.alpha_bucket(opacity)
+        on_screen = ((pos[:, 0] > -CULL_MARGIN) & (pos[:, 0] < SCREEN_WIDTH + CULL_MARGIN)
+                     & (pos[:, 1] > -CULL_MARGIN) & (pos[:, 1] < SCREEN_HEIGHT + CULL_MARGIN))
+        visible = np.flatnonzero((sizes >= 1) & (buckets > 0) & on_screen)
+        if visible.size == 0:
+            return
+        color = SpriteCache.quantize_color(self.color[:n][visible].astype(np.int64))
+        keys = ((diameters[visible] << 32) | (buckets[visible] << 24)
+                | (color[:, 0] << 16) | (color[:, 1] << 8) | color[:, 2])
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sprites = [SPRITES.get_quantized(k >> 32, ((k >> 16) & 255, (k >> 8) & 255, k & 255), (k >> 24) & 255)
+                   for k in unique_keys.tolist()]
+        corners = pos[visible] - (diameters[visible] / 2)[:, None]
+        blit_batch(surface, zip(map(sprites.__getitem__, inverse.tolist()),
+                                zip(corners[:, 0].tolist(), corners[:, 1].tolist())))
+
+    def splat(self, light, scale, alpha=1.0):
+        """Menambahkan cahaya percikan ke array `light` (lebar, tinggi, 3) beresolusi 1/scale.
+
+        Tiap percikan menjadi satu titik aditif dengan cahaya sebanding luas
+        sprite-nya (dibatasi GLOW_MAX_GAIN agar tidak langsung putih), dijumlahkan
+        dengan np.bincount tanpa blit per partikel. Mengembalikan Rect area
+        yang terisi, atau None.
+        """
+        n = self.count
+        if n == 0:
+            return None
+        pos, opacity, sizes = self._appearance(alpha)
+        width, height = light.shape[:2]
+        x = (pos[:, 0] / scale).astype(np.int64)
+        y = (pos[:, 1] / scale).astype(np.int64)
+        lit = np.flatnonzero((sizes >= 1) & (opacity >= ALPHA_STEP / 2)
+                             & (x >= 0) & (x < width) & (y >= 0) & (y < height))
+        if lit.size == 0:
+            return None
+        x, y = x[lit], y[lit]
+        x0, y0 = int(x.min()), int(y.min())
+        w, h = int(x.max()) - x0 + 1, int(y.max()) - y0 + 1
+        coverage = np.minimum(GLOW_MAX_GAIN, np.pi * (sizes[lit] / scale) ** 2)
+        weights = self.color[:n][lit] * (opacity[lit] / 255 * coverage)[:, None]
+        # Satu bincount untuk ketiga kanal: indeks ((x * h) + y) * 3 + kanal di dalam area
+        index = ((x - x0) * h + (y - y0)) * 3
+        light[x0:x0 + w, y0:y0 + h] += np.bincount(
+            (index[:, None] + np.arange(3)).ravel(), weights=weights.ravel(), minlength=w * h * 3
+        ).reshape(w, h, 3)
+        return pygame.Rect(x0, y0, w, h)
+
+    def span_x(self, y0, y1, margin=CULL_MARGIN):
+        """Rentang x percikan di antara baris y0..y1 (posisi sekarang atau sebelumnya), atau None."""
+        n = self.count
+        xs = []
+        for pos in (self.pos[:n], self.prev_pos[:n]):
+            inside = pos[(pos[:, 1] > y0 - margin) & (pos[:, 1] < y1 + margin), 0]
+            if inside.size:
+                xs += [inside.min(), inside.max()]
+        if not xs:
+            return None
+        return min(xs) - margin, max(xs) + margin
+
+
+# --- Backend Simulasi Paralel ---
+_WORKER_SHM = {}
+
+
+def _integrate_shard_worker(shm_name, capacity, shards, seed, frame):
+    """Dijalankan di proses worker: menempel ke shared memory lalu meng-update shard."""
+    shm = _WORKER_SHM.get(shm_name)
+    if shm is None:
+        for old in _WORKER_SHM.values():
+            old.close()
+        _WORKER_SHM.clear()
+        shm = _WORKER_SHM[shm_name] = shared_memory.SharedMemory(name=shm_name)
+    columns = ParticlePool.column_views(shm.buf, capacity)
+    for lo, hi, shard in shards:
+        integrate_sparks(columns, lo, hi, np.random.default_rng((seed, frame, shard)))
+
+
+class ParallelSimBackend:
+    """Meng-update shard SPARKS di process pool, dengan kolom di shared memory.
+
+    Worker hanya menerima nama shared memory dan rentang shard, jadi tidak
+    ada state partikel yang di-pickle per frame. Karena RNG tiap shard
+    diturunkan dari (seed, frame, nomor shard), hasilnya identik dengan mode
+    satu proses. Bila pool proses tidak bisa dibuat atau worker gagal,
+    backend menonaktifkan dirinya dan SPARKS kembali ke mode satu proses.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.available = self.workers > 1
+
+    def _start(self):
+        try:
+            # Impor modul ini bebas efek samping, jadi 'spawn' juga aman
+            context = multiprocessing.get_context(PARALLEL_START_METHOD)
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context)
+        except (ValueError, OSError) as e:
+            self._disable(e)
+
+    def _disable(self, reason):
+        print(f"Warning: simulasi paralel dinonaktifkan ({reason}), kembali ke satu proses.",
+              file=sys.stderr)
+        self.available = False
+        self.shutdown()
+
+    def integrate(self, pool, shards):
+        """Menjalankan shard di worker. Mengembalikan False bila harus fallback.
+
+        Bila sebagian worker gagal, shard lain sudah ter-update di shared
+        memory, jadi hanya batch yang gagal diulang di proses ini (dengan RNG
+        shard yang sama) dan hasilnya tetap True; frame berikutnya baru
+        berjalan di satu proses.
+        """
+        if not self.available:
+            return False
+        if self.executor is None:
+            self._start()
+            if not self.available:
+                return False
+        # Shard dibagi rata ke worker agar satu frame cukup satu pesan per worker
+        batches = [shards[i::self.workers] for i in range(self.workers) if shards[i::self.workers]]
+        futures, failed, error = [], [], None
+        for batch in batches:
+            try:
+                futures.append((batch, self.executor.submit(
+                    _integrate_shard_worker, pool.shm.name, pool.capacity,
+                    batch, pool.seed, pool.frame)))
+            except (concurrent.futures.BrokenExecutor, OSError) as e:
+                failed.extend(batch)
+                error = e
+        for batch, future in futures:
+            try:
+                future.result()
+            except (concurrent.futures.BrokenExecutor, OSError) as e:
+                failed.extend(batch)
+                error = e
+        if error is not None:
+            self._disable(error)
+            pool.integrate_shards(failed)
+        return True
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+SPARKS = ParticlePool()
+
+
+# --- Anggaran Partikel & Level Detail ---
+class DetailGovernor:
+    """Mengatur level detail (MIN_DETAIL..1) dari biaya frame dan jumlah partikel.
+
+    Biaya update + draw dan jumlah partikel hidup dirata-rata (EMA) setiap
+    frame. Bila salah satunya melewati anggaran, detail turun cepat; detail
+    baru dipulihkan perlahan setelah beban di bawah DETAIL_HEADROOM. Level
+    detail menskalakan jumlah percikan (termasuk crackle) dan menentukan
+    apakah pantulan air digambar.
+    """
+
+    def __init__(self, particle_budget=PARTICLE_BUDGET, frame_budget_ms=FRAME_BUDGET_MS):
+        self.particle_budget = particle_budget
+        self.frame_budget_ms = frame_budget_ms
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        self.detail = 1.0
+        self.update_ms = self.draw_ms = 0.0
+        self.particles = 0
+
+    def record(self, update_ms, draw_ms, particles):
+        self.update_ms += (update_ms - self.update_ms) * DETAIL_SMOOTHING
+        self.draw_ms += (draw_ms - self.draw_ms) * DETAIL_SMOOTHING
+        self.particles = particles
+        if not self.enabled:
+            return
+        load = max((self.update_ms + self.draw_ms) / self.frame_budget_ms,
+                   particles / self.particle_budget)
+        if load > 1:
+            self.detail = max(MIN_DETAIL, self.detail * 0.9)
+        elif load < DETAIL_HEADROOM:
+            self.detail = min(1.0, self.detail + 0.01)
+
+    def spark_count(self, n):
+        """Jumlah percikan yang boleh dibuat dari n yang diminta template."""
+        if not self.enabled:
+            return n
+        room = max(0, self.particle_budget - len(SPARKS))
+        return min(room, max(1, round(n * self.detail)))
+
+    @property
+    def reflections(self):
+        return not self.enabled or self.detail >= REFLECTION_MIN_DETAIL
+
+
+GOVERNOR = DetailGovernor()
+
+
+# --- Template Bentuk Ledakan ---
+CIRCLE_RESOLUTION = 1024  # Jumlah arah di tabel lingkaran
+
+
+class BurstTemplate:
+    """Tabel arah satuan dan rentang parameter untuk satu bentuk ledakan.
+
+    Tabel dihitung sekali; membuat ledakan cukup memilih baris tabel lalu
+    memberi jitter pada kecepatan, ukuran dan umur. Rentang ditulis sebagai
+    (min, max) atau satu angka tetap. `color` berupa 'primary', 'palette'
+    (diambil dari Firework) atau daftar warna yang dipilih acak per percikan.
+    Bila `sequential`, setiap ledakan memakai semua arah sesuai urutan
+    (bentuk gambar seperti hati); jika tidak, arah diambil acak sebanyak `count`.
+    """
+
+    def __init__(self, directions, speed, size, lifespan, count=None, color='primary',
+                 state=STATE_BURNING, can_crackle=False, sequential=False):
+        directions = np.asarray(directions, dtype=np.float64)
+        self.directions = directions / np.hypot(directions[:, 0], directions[:, 1])[:, None]
+        self.speed, self.size, self.lifespan = speed, size, lifespan
+        self.count = len(self.directions) if sequential else count
+        self.color = color if isinstance(color, str) else np.array(color, dtype=np.uint8).reshape(-1, 3)
+        self.state, self.can_crackle, self.sequential = state, can_crackle, sequential
+
+    @classmethod
+    def circle(cls, **kwargs):
+        theta = np.linspace(0, 2 * math.pi, CIRCLE_RESOLUTION, endpoint=False)
+        return cls(np.column_stack((np.cos(theta), np.sin(theta))), **kwargs)
+
+    @classmethod
+    def from_curve(cls, curve, n, **kwargs):
+        """Template berurutan dari kurva parametrik curve(t) -> (x, y), t di [0, 2*pi)."""
+        x, y = curve(np.arange(n) / n * 2 * math.pi)
+        return cls(np.column_stack((x, y)), sequential=True, **kwargs)
+
+    @staticmethod
+    def _sample(spec, n):
+        if isinstance(spec, (tuple, list)):
+            return RNG.uniform(spec[0], spec[1], n)
+        return spec
+
+    def spawn_count(self):
+        if self.sequential:
+            return self.count
+        lo, hi = self.count if isinstance(self.count, (tuple, list)) else (self.count, self.count)
+        return int(RNG.integers(lo, hi, endpoint=True))
+
+    def sample(self, n, primary_color, palette):
+        """Mengembalikan (vel, warna, ukuran, umur) untuk n percikan."""
+        if self.sequential:
+            # Bila dikurangi, ambil arah dengan jarak merata agar bentuknya tetap
+            directions = self.directions if n == self.count else \
+                self.directions[np.linspace(0, self.count, n, endpoint=False).astype(np.int64)]
+        else:
+            directions = self.directions[RNG.integers(0, len(self.directions), n)]
+        vel = directions * np.reshape(self._sample(self.speed, n), (-1, 1))
+        if isinstance(self.color, str):
+            colors = primary_color if self.color == 'primary' else palette[RNG.integers(0, len(palette), n)]
+        elif len(self.color) == 1:
+            colors = self.color[0]
+        else:
+            colors = self.color[RNG.integers(0, len(self.color), n)]
+        return vel, colors, self._sample(self.size, n), self._sample(self.lifespan, n)
 
-    def is_alive(self): return self.pos.y < SCREEN_HEIGHT + \
-        20 and self.lifespan > 0
+    def to_dict(self):
+        spec = {'directions': self.directions.tolist(), 'speed': self.speed, 'size': self.size,
+                'lifespan': self.lifespan, 'count': self.count, 'state': int(self.state),
+                'can_crackle': self.can_crackle, 'sequential': self.sequential}
+        spec['color'] = self.color if isinstance(self.color, str) else self.color.tolist()
+        return spec
+
+    @classmethod
+    def from_dict(cls, spec):
+        spec = dict(spec)
+        if spec.get('sequential'):
+            spec.pop('count', None)
+        return cls(**spec)
+
+
+def _heart_curve(t):
+    scale = 12.0
+    x = scale * (16 * np.sin(t)**3)
+    y = -scale * (13 * np.cos(t) - 5*np.cos(2*t) - 2*np.cos(3*t) - np.cos(4*t))
+    return x, y
+
+
+BURST_TEMPLATES = {
+    'peony': BurstTemplate.circle(count=(90, 160), speed=(3.5, 6.5), size=(1.5, 2.5),
+                                  lifespan=(100, 150), can_crackle=True),
+    'willow': BurstTemplate.circle(count=(60, 100), speed=(2 * 0.8, 4 * 0.8), size=(1, 2),
+                                   lifespan=(150, 200), color=[GOLD], state=STATE_GLITTER),
+    'ring': BurstTemplate.circle(count=100, speed=(2.5, 3.5), size=2, lifespan=120, can_crackle=True),
+    'heart': BurstTemplate.from_curve(_heart_curve, 120, speed=(1.5, 2.5), size=(2, 3),
+                                      lifespan=(110, 140), color=HEART_COLORS),
+    'multi': BurstTemplate.circle(count=(5, 8), speed=(3.0, 5.0), size=4, lifespan=(60, 90),
+                                  color=[(255, 255, 200)], state=STATE_COMET),
+    'crackle': BurstTemplate.circle(count=NUM_CRACKLE_PARTICLES, speed=(0.5, 3.0), size=(1, 2),
+                                    lifespan=(30, 50), color='palette'),
+}
+
+
+def register_burst_template(name, template):
+    """Mendaftarkan bentuk ledakan baru yang bisa dipakai sebagai firework_type."""
+    BURST_TEMPLATES[name] = template
+
+
+def save_burst_templates(path):
+    with open(path, 'w') as f:
+        json.dump({name: t.to_dict() for name, t in BURST_TEMPLATES.items()}, f)
+
+
+def load_burst_templates(path):
+    """Memuat (dan menimpa) template dari file JSON buatan save_burst_templates."""
+    with open(path) as f:
+        for name, spec in json.load(f).items():
+            register_burst_template(name, BurstTemplate.from_dict(spec))
 
 
 class Firework:
     """Kelas kembang api yang dirombak untuk mendukung sub-ledakan (multi-break)."""
 
-    def __init__(self, start_pos=None, firework_type='peony', initial_explosion=False, is_sub_explosion=False):
-        self.particles, self.smoke_trail, self.reflections = [], [], []
-        self.firework_type = firework_type
+    __slots__ = ('id', 'spark_count', 'firework_type', 'sub_explosions',
+                 'exploded', 'primary_color', 'crackle_palette', 'rocket')
+    _ids = itertools.count(1)
+
+    def __init__(self, *args, **kwargs):
         self.sub_explosions = []
+        self.crackle_palette = np.zeros((30, 3), dtype=np.uint8)
+        self.rocket = None
+        self.reset(*args, **kwargs)
+
+    def reset(self, start_pos=None, firework_type='peony', initial_explosion=False, is_sub_explosion=False,
+              color=None, launch_x=None):
+        self.id = next(Firework._ids)
+        self.spark_count = 0  # Jumlah percikan milik kembang api ini di SPARKS
+        self.firework_type = firework_type
         self.exploded = False
-        self.primary_color = (random.randint(100, 255), random.randint(
-            100, 255), random.randint(100, 255))
-        self.crackle_palette = [(random.randint(100, 255), random.randint(
-            100, 255), random.randint(100, 255)) for _ in range(30)]
-
-        if not is_sub_explosion:
-            launch_sound.play()
+        self.primary_color = color or (RANDOM.randint(100, 255), RANDOM.randint(
+            100, 255), RANDOM.randint(100, 255))
+        self.crackle_palette[:] = RNG.integers(100, 255, self.crackle_palette.shape, endpoint=True)
 
         if initial_explosion or is_sub_explosion:
-            explode_sound.play()
+            if not is_sub_explosion:
+                AUDIO.trigger('launch', start_pos[0])
+            AUDIO.trigger('explode', start_pos[0])
             self.explode(start_pos)
         else:  # Peluncuran roket dari bawah
-            start_x = random.randint(
+            start_x = launch_x if launch_x is not None else RANDOM.randint(
                 int(SCREEN_WIDTH * 0.2), int(SCREEN_WIDTH * 0.8))
-            start_vy = -random.uniform(10, 14.5)
-            self.rocket = Particle(
-                (start_x, SCREEN_HEIGHT), (0, start_vy), WHITE, 3, ROCKET_LIFESPAN, True)
-            self.rocket_reflection = self._create_reflection_particle(
-                self.rocket)
-
-    def _create_reflection_particle(self, p):
-        # ... (Tidak ada perubahan signifikan di sini)
-        ry = WATERLINE_Y + (WATERLINE_Y - p.pos.y)
-        rvy = -p.vel.y * 0.3
-        return Particle((p.pos.x, ry), (p.vel.x, rvy), p.color, p.size, p.lifespan, False, False, True)
+            AUDIO.trigger('launch', start_x)
+            start_vy = -RANDOM.uniform(10, 14.5)
+            # Roket dimiliki permanen oleh objek Firework ini dan ikut dipakai ulang
+            rocket_args = ((start_x, SCREEN_HEIGHT), (0, start_vy), WHITE, 3, ROCKET_LIFESPAN, True)
+            if self.rocket is None:
+                self.rocket = Particle(*rocket_args)
+            else:
+                self.rocket.reset(*rocket_args)
 
     def update(self):
         if not self.exploded:
             self.rocket.update()
-            self.rocket_reflection = self._create_reflection_particle(
-                self.rocket)
-            if random.random() < 0.6:
-                self.smoke_trail.append(
-                    Particle(self.rocket.pos, (0, 0), GRAY, random.randint(1, 3), 40, False))
+            TRAILS.stamp(self.rocket.prev_pos, self.rocket.pos, GRAY, SMOKE_WIDTH)
             if self.rocket.vel.y >= 0:
-                explode_sound.play()
+                AUDIO.trigger('explode', self.rocket.pos.x)
                 self.rocket.lifespan = 0
                 self.explode(self.rocket.pos)
-        else:
-            new_particles, new_reflections = [], []
-            for i in range(len(self.particles) - 1, -1, -1):
-                p = self.particles[i]
-                p.update()
-                # Logika baru untuk Multi-Break
-                if p.state == 'comet' and not p.is_alive():
-                    sub_type = random.choice(['peony', 'crackle'])
-                    self.sub_explosions.append(
-                        Firework(p.pos, sub_type, is_sub_explosion=True))
-                    self.particles.pop(i)
-                    continue
-
-                if p.can_crackle and not p.crackled and p.lifespan < p.initial_lifespan * 0.4 and random.random() < CRACKLE_CHANCE:
-                    p.crackled = True
-                    p.lifespan = 0
-                    crackle_sound.play()
-                    burst, reflect = self._create_crackle(p.pos)
-                    new_particles.extend(burst)
-                    new_reflections.extend(reflect)
-            self.particles.extend(new_particles)
-            self.reflections.extend(new_reflections)
-
-        for group in [self.smoke_trail, self.particles, self.reflections, self.sub_explosions]:
-            for item in group:
-                item.update()
-
-        # Bersihkan semua partikel dan sub-ledakan yang mati
-        self.particles = [p for p in self.particles if p.is_alive()]
-        self.smoke_trail = [s for s in self.smoke_trail if s.is_alive()]
-        self.reflections = [r for r in self.reflections if r.is_alive()]
-        self.sub_explosions = [
-            se for se in self.sub_explosions if not se.is_done()]
+
+        # Percikan ledakan di-update sekali per frame secara massal oleh
+        # SPARKS.update() dan asapnya memudar di TRAILS; di sini cukup sub-ledakan.
+        update_and_sweep(self.sub_explosions)
+
+    def on_crackle(self, pos):
+        """Dipanggil SPARKS saat salah satu percikan crackle pecah."""
+        AUDIO.trigger('crackle', pos[0])
+        self._spawn_burst(BURST_TEMPLATES['crackle'], pos)
+
+    def on_comet_burst(self, pos):
+        """Dipanggil SPARKS saat komet multi-break habis umurnya."""
+        sub_type = RANDOM.choice(('peony', 'crackle'))
+        self.sub_explosions.append(
+            Firework.pool.acquire(pos, sub_type, is_sub_explosion=True))
 
     def explode(self, pos):
         self.exploded = True
-        methods = {'peony': self._create_peony, 'willow': self._create_willow, 'ring': self._create_ring,
-                   'heart': self._create_heart, 'multi': self._create_multi_break}
-        particles, reflections = methods.get(
-            self.firework_type, self._create_peony)(pos)
-        self.particles.extend(particles)
-        self.reflections.extend(reflections)
-
-    def _create_explosion_base(self, pos, num, func):
-        p, r = [], []
-        [p.append(func(pos)) for _ in range(num)]
-        [r.append(self._create_reflection_particle(i)) for i in p]
-        return p, r
-
-    # PERBAIKAN: Semua metode pembuatan ledakan diubah untuk membuat Vector2 dengan benar.
-    def _create_peony(self, pos):
-        def create_particle_func(p):
-            vel = Vector2()
-            vel.from_polar((random.uniform(3.5, 6.5), random.uniform(0, 360)))
-            return Particle(p, vel, self.primary_color, random.uniform(1.5, 2.5), random.uniform(100, 150), True, True)
-        return self._create_explosion_base(pos, random.randint(90, 160), create_particle_func)
-
-    def _create_willow(self, pos):
-        def create_particle_func(p):
-            vel = Vector2()
-            vel.from_polar((random.uniform(2, 4), random.uniform(0, 360)))
-            vel *= 0.8
-            return Particle(p, vel, GOLD, random.uniform(1, 2), random.uniform(150, 200), True, False, state='glitter')
-        return self._create_explosion_base(pos, random.randint(60, 100), create_particle_func)
-
-    def _create_ring(self, pos):
-        def create_particle_func(p):
-            vel = Vector2()
-            vel.from_polar((random.uniform(2.5, 3.5), random.uniform(0, 360)))
-            return Particle(p, vel, self.primary_color, 2, 120, True, True)
-        return self._create_explosion_base(pos, 100, create_particle_func)
-
-    def _create_heart(self, pos):
-        particles, reflections = [], []
-        for i in range(120):
-            t = (i / 120) * 2 * math.pi
-            scale = 12.0
-            x = scale * (16 * (math.sin(t)**3))
-            y = -scale * (13 * math.cos(t) - 5*math.cos(2*t) -
-                          2*math.cos(3*t) - math.cos(4*t))
-            p = Particle(pos, Vector2(x, y).normalize() * random.uniform(1.5, 2.5), random.choice(
-                HEART_COLORS), random.uniform(2, 3), random.uniform(110, 140), True, False)
-            particles.append(p)
-            reflections.append(self._create_reflection_particle(p))
-        return particles, reflections
-
-    def _create_multi_break(self, pos):
-        def create_particle_func(p):
-            vel = Vector2()
-            vel.from_polar((random.uniform(3.0, 5.0), random.uniform(0, 360)))
-            return Particle(p, vel, (255, 255, 200), 4, random.uniform(60, 90), True, False, state='comet')
-        return self._create_explosion_base(pos, random.randint(5, 8), create_particle_func)
-
-    def _create_crackle(self, pos):
-        def create_particle_func(p):
-            vel = Vector2()
-            vel.from_polar((random.uniform(0.5, 3.0), random.uniform(0, 360)))
-            return Particle(p, vel, random.choice(self.crackle_palette), random.uniform(1, 2), random.uniform(30, 50), True, False)
-        return self._create_explosion_base(pos, NUM_CRACKLE_PARTICLES, create_particle_func)
+        self._spawn_burst(BURST_TEMPLATES.get(self.firework_type, BURST_TEMPLATES['peony']), pos)
 
-    def draw(self, surface):
-        if not self.exploded and hasattr(self, 'rocket'):
-            self.rocket.draw(surface)
-            if hasattr(self, 'rocket_reflection'):
-                self.rocket_reflection.draw(surface)
-        for group in [self.smoke_trail, self.particles, self.reflections, self.sub_explosions]:
-            for item in group:
-                item.draw(surface)
+    def _spawn_burst(self, template, pos):
+        """Memasukkan percikan dari template ke SPARKS. Pantulannya dibuat oleh WaterReflection."""
+        n = GOVERNOR.spark_count(template.spawn_count())
+        if n == 0:
+            return
+        vel, colors, sizes, lifespans = template.sample(n, self.primary_color, self.crackle_palette)
+        SPARKS.spawn(self, (pos[0], pos[1]), vel, colors, sizes, lifespans,
+                     state=template.state, can_crackle=template.can_crackle)
+
+    def draw(self, surface, alpha=1.0):
+        if not self.exploded and self.rocket is not None:
+            self.rocket.draw(surface, alpha)
+        for sub in self.sub_explosions:
+            sub.draw(surface, alpha)
 
     def is_done(self):
-        return self.exploded and not self.particles and not self.smoke_trail and not self.reflections and not self.sub_explosions
+        return self.exploded and not self.spark_count and not self.sub_explosions
+
+    def is_alive(self): return not self.is_done()
+
+    def release(self):
+        for sub in self.sub_explosions:
+            sub.release()
+        self.sub_explosions.clear()
+        Firework.pool.release(self)
+
+
+Firework.pool = ObjectPool(Firework)
 
 
 class ShootingStar:
     """Kelas untuk bintang jatuh di latar belakang."""
 
+    __slots__ = ('pos', 'vel', 'lifespan')
+
     def __init__(self):
-        self.pos = Vector2(random.randint(0, SCREEN_WIDTH),
-                           random.randint(10, 50))
-        self.vel = Vector2(-random.uniform(15, 25), random.uniform(5, 10))
+        self.pos, self.vel = Vector2(), Vector2()
+        self.reset()
+
+    def reset(self):
+        self.pos.update(RANDOM.randint(0, SCREEN_WIDTH),
+                        RANDOM.randint(10, 50))
+        self.vel.update(-RANDOM.uniform(15, 25), RANDOM.uniform(5, 10))
         self.lifespan = 100
-        self.particles = []
 
     def update(self):
+        """Hanya menggoreskan ekornya ke TRAILS; yang tampil adalah jejak itu."""
         self.lifespan -= 1
         if self.is_alive():
-            self.particles.append(
-                Particle(self.pos.copy(), (0, 0), WHITE, random.uniform(1, 2), 20, False))
+            start = Vector2(self.pos)
             self.pos += self.vel
-        for p in self.particles:
-            p.update()
-        self.particles = [p for p in self.particles if p.is_alive()]
+            TRAILS.stamp(start, self.pos, WHITE, SHOOTING_STAR_WIDTH)
 
-    def draw(self, surface): [p.draw(surface) for p in self.particles]
     def is_alive(self): return self.lifespan > 0
 
+    def release(self):
+        ShootingStar.pool.release(self)
+
+
+ShootingStar.pool = ObjectPool(ShootingStar)
+ENTITY_POOLS = {'firework': Firework.pool, 'shooting_star': ShootingStar.pool}
+
+
+def pool_stats():
+    """Alokasi/pemakaian ulang tiap pool objek beserta jeda GC."""
+    stats = {name: pool.stats() for name, pool in ENTITY_POOLS.items()}
+    stats['gc'] = GC_MONITOR.stats()
+    return stats
+
 # --- Fungsi-fungsi Bantuan ---
 
 
 def create_stars(num_stars):
     """Membuat latar belakang bintang yang berkelip."""
-    return [{'pos': (random.randint(0, SCREEN_WIDTH), random.randint(0, int(WATERLINE_Y))),
-             'brightness': random.choice([40, 60, 90, 120]),
-             'flicker_speed': random.uniform(0.0005, 0.002)} for _ in range(num_stars)]
+    return [{'pos': (RANDOM.randint(0, SCREEN_WIDTH), RANDOM.randint(0, int(WATERLINE_Y))),
+             'brightness': RANDOM.choice(STAR_BRIGHTNESS),
+             'flicker_speed': RANDOM.uniform(0.0005, 0.002)} for _ in range(num_stars)]
 
 
-def create_text_particles(message, font):
-    """Mengubah teks menjadi koordinat target untuk partikel."""
-    if not message:
-        return []
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_targets(message, font):
+    """Koordinat target partikel untuk `message`, di-cache per pesan.
+
+    Kanal alpha teks dibaca sekali lewat surfarray, lalu setiap piksel ketiga
+    yang tidak transparan menjadi satu target.
+    """
     text_surface = font.render(message, True, GOLD)
     text_rect = text_surface.get_rect(
         center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 3))
-    particles = []
-    for x in range(0, text_surface.get_width(), 3):
-        for y in range(0, text_surface.get_height(), 3):
-            if text_surface.get_at((x, y))[3] > 0:
-                tp = TextParticle((text_rect.x + x, text_rect.y + y))
-                tp.state = 'moving_to_target'
-                particles.append(tp)
-    return particles
+    alpha = pygame.surfarray.pixels_alpha(text_surface)
+    xs, ys = np.nonzero(alpha[::3, ::3])
+    del alpha  # Melepas kunci surface
+    targets = np.column_stack((text_rect.x + xs * 3, text_rect.y + ys * 3)).astype(np.float64)
+    targets.flags.writeable = False
+    return targets
+
+
+def create_text_particles(message, font):
+    """Mengubah teks menjadi medan partikel yang terbang ke koordinat targetnya."""
+    if not message:
+        return TextParticleField(())
+    return TextParticleField(text_targets(message, font))
 
 
 def create_city():
@@ -404,45 +1435,334 @@ def create_city():
     city = {'rects': [], 'windows': []}
     x = 0
     while x < SCREEN_WIDTH:
-        w = random.randint(30, 80)
-        h = random.randint(int(SCREEN_HEIGHT * 0.1), int(SCREEN_HEIGHT * 0.25))
+        w = RANDOM.randint(30, 80)
+        h = RANDOM.randint(int(SCREEN_HEIGHT * 0.1), int(SCREEN_HEIGHT * 0.25))
         rect = pygame.Rect(x, WATERLINE_Y - h, w, h)
         city['rects'].append(rect)
         for _ in range(int(w * h / 800)):
             city['windows'].append({
-                'pos': (random.randint(rect.left+2, rect.right-4), random.randint(rect.top+2, rect.bottom-4)),
-                'on': random.random() > 0.4
+                'pos': (RANDOM.randint(rect.left+2, rect.right-4), RANDOM.randint(rect.top+2, rect.bottom-4)),
+                'on': RANDOM.random() > 0.4
             })
-        x += w + random.randint(1, 5)
+        x += w + RANDOM.randint(1, 5)
     return city
 
 
-def draw_background_elements(surface, stars, moon_pos, city, shooting_stars):
-    for star in stars:
-        if random.random() < star['flicker_speed']:
-            star['brightness'] = random.choice([40, 60, 90, 120])
-        pygame.draw.circle(surface, (star['brightness'],)*3, star['pos'], 1)
-    pygame.draw.circle(surface, (200, 200, 180), moon_pos, 25)
-    pygame.draw.circle(surface, (0, 0, 8), (moon_pos[0]+10, moon_pos[1]-5), 22)
-    for ss in shooting_stars:
-        ss.draw(surface)
-    water_surf = pygame.Surface(
-        (SCREEN_WIDTH, SCREEN_HEIGHT - WATERLINE_Y), pygame.SRCALPHA)
-    for i in range(15):
-        alpha = 40 - i*2
-        pygame.draw.line(water_surf, (100, 100, 120, alpha), (0, 10+i*4 + math.sin(pygame.time.get_ticks() /
-                         500 + i)*2), (SCREEN_WIDTH, 10+i*4 + math.sin(pygame.time.get_ticks()/500 + i)*2))
-    water_surf.fill(WATER_OVERLAY_COLOR, special_flags=pygame.BLEND_RGBA_ADD)
-    surface.blit(water_surf, (0, WATERLINE_Y))
-    for rect in city['rects']:
-        pygame.draw.rect(surface, CITY_COLOR, rect)
-    for window in city['windows']:
-        if window['on']:
-            if random.random() < 0.0005:
-                window['on'] = False
-            pygame.draw.rect(surface, GOLD, (*window['pos'], 2, 2))
-        elif random.random() < 0.0001:
-            window['on'] = True
+class Background:
+    """Latar belakang dengan lapisan statis yang di-cache.
+
+    Langit (bintang dan bulan) serta siluet kota dirender sekali ke lapisan
+    masing-masing. Kedipan bintang dan lampu jendela yang menyala/mati hanya
+    menggambar ulang persegi kecil di lapisan itu, dan riak air diambil dari
+    siklus frame opak yang sudah dihitung di awal. Kapan sebuah bintang atau
+    jendela berubah diambil di muka (RANDOM.steps_until) dan disimpan di heap,
+    jadi tiap langkah hanya menyentuh yang memang jatuh tempo.
+    """
+
+    STAR, WINDOW = 0, 1
+    MAX_DIRTY_SPANS = 32  # Lebih dari ini digabung jadi satu rentang selebar layar
+
+    def __init__(self, stars, moon_pos, city):
+        self.stars, self.moon_pos, self.city = stars, moon_pos, city
+        self.water_top = int(WATERLINE_Y)
+        self.city_top = min(rect.top for rect in city['rects'])
+        self.sky = self.city_layer = None
+        self.water_frames = []
+        self.dirty = []  # Rentang kolom (x0, x1) lapisan yang berubah, dikosongkan WaterReflection
+        self.step = 0
+        self._events = []  # Heap (langkah, urutan, jenis, bintang/jendela)
+        self._seq = itertools.count()
+        for star in stars:
+            self._schedule(self.STAR, star)
+        for window in city['windows']:
+            self._schedule(self.WINDOW, window)
+
+    def _schedule(self, kind, item):
+        if kind == self.STAR:
+            chance = item['flicker_speed']
+        else:
+            chance = WINDOW_OFF_CHANCE if item['on'] else WINDOW_ON_CHANCE
+        heapq.heappush(self._events, (self.step + RANDOM.steps_until(chance), next(self._seq), kind, item))
+
+    def _build(self, surface):
+        self._mark_dirty(0, SCREEN_WIDTH)
+        self.sky = pygame.Surface(surface.get_size(), 0, surface)
+        self.sky.fill(SKY_COLOR)
+        for star in self.stars:
+            pygame.draw.circle(self.sky, (star['brightness'],)*3, star['pos'], 1)
+        self._draw_moon()
+
+        self.city_layer = pygame.Surface((SCREEN_WIDTH, self.water_top - self.city_top), 0, surface)
+        self.city_layer.fill(COLORKEY)
+        self.city_layer.set_colorkey(COLORKEY, pygame.RLEACCEL)
+        for rect in self.city['rects']:
+            pygame.draw.rect(self.city_layer, CITY_COLOR, rect.move(0, -self.city_top))
+        for window in self.city['windows']:
+            self._draw_window(window)
+
+        # Frame air dibuat saat pertama ditampilkan agar frame pertama tetap cepat
+        self.water_frames = [None] * WATER_FRAMES
+
+    def _water_frame(self, f):
+        """Frame riak ke-f. Garis riak bergerak dengan sin(time/500 + i), satu siklus = 1000*pi ms.
+
+        Overlay air langsung dicampur ke warna langit agar frame-nya opak.
+        """
+        frame = self.water_frames[f]
+        if frame is None:
+            water_h = SCREEN_HEIGHT - self.water_top
+            phase = f / WATER_FRAMES * 2 * math.pi
+            water_surf = pygame.Surface((SCREEN_WIDTH, water_h), pygame.SRCALPHA)
+            for i in range(15):
+                alpha = 40 - i*2
+                y = 10 + i*4 + math.sin(phase + i)*2
+                pygame.draw.line(water_surf, (100, 100, 120, alpha), (0, y), (SCREEN_WIDTH, y))
+            water_surf.fill(WATER_OVERLAY_COLOR, special_flags=pygame.BLEND_RGBA_ADD)
+            frame = self.water_frames[f] = pygame.Surface((SCREEN_WIDTH, water_h), 0, self.sky)
+            frame.fill(SKY_COLOR)
+            frame.blit(water_surf, (0, 0))
+        return frame
+
+    def _draw_moon(self):
+        pygame.draw.circle(self.sky, (200, 200, 180), self.moon_pos, 25)
+        pygame.draw.circle(self.sky, SKY_COLOR, (self.moon_pos[0]+10, self.moon_pos[1]-5), 22)
+
+    def _mark_dirty(self, x0, x1):
+        """Mencatat kolom yang berubah; tetap terbatas meski tidak ada yang mengosongkan
+        (mis. pantulan dimatikan DetailGovernor)."""
+        if self.dirty == [(0, SCREEN_WIDTH)]:
+            return
+        if len(self.dirty) >= self.MAX_DIRTY_SPANS:
+            self.dirty[:] = [(0, SCREEN_WIDTH)]
+        else:
+            self.dirty.append((x0, x1))
+
+    def _redraw_star(self, star):
+        """Menggambar ulang area kecil di sekitar satu bintang, dengan urutan yang sama."""
+        dirty = pygame.Rect(star['pos'][0] - 2, star['pos'][1] - 2, 5, 5)
+        self._mark_dirty(dirty.left, dirty.right)
+        self.sky.set_clip(dirty)
+        self.sky.fill(SKY_COLOR, dirty)
+        for other in self.stars:
+            if dirty.collidepoint(other['pos']):
+                pygame.draw.circle(self.sky, (other['brightness'],)*3, other['pos'], 1)
+        self._draw_moon()
+        self.sky.set_clip(None)
+
+    def _draw_window(self, window):
+        x, y = window['pos']
+        color = GOLD if window['on'] else CITY_COLOR
+        self._mark_dirty(x, x + 2)
+        self.city_layer.fill(color, (x, y - self.city_top, 2, 2))
+
+    def update(self):
+        """Kelip bintang dan lampu jendela; dipanggil sekali per langkah simulasi."""
+        if self.sky is None:
+            return
+        self.step += 1
+        events = self._events
+        while events and events[0][0] <= self.step:
+            _, _, kind, item = heapq.heappop(events)
+            if kind == self.STAR:
+                item['brightness'] = RANDOM.choice(STAR_BRIGHTNESS)
+                self._redraw_star(item)
+            else:
+                item['on'] = not item['on']
+                self._draw_window(item)
+            self._schedule(kind, item)
+
+    def draw(self, surface, time):
+        if self.sky is None:
+            self._build(surface)
+        surface.blit(self.sky, (0, 0), (0, 0, SCREEN_WIDTH, self.water_top))
+        frame = int(time / (1000 * math.pi) * WATER_FRAMES) % WATER_FRAMES
+        surface.blit(self._water_frame(frame), (0, self.water_top))
+        surface.blit(self.city_layer, (0, self.city_top))
+
+
+class WaterReflection:
+    """Pantulan di bawah WATERLINE_Y sebagai satu pass pasca-proses.
+
+    Langit di atas garis air (termasuk kembang api yang sudah digambar)
+    diperkecil secara vertikal, diredupkan, lalu disalin baris demi baris
+    secara terbalik ke area air dengan geseran riak. Tidak ada partikel yang
+    perlu digandakan, dan pantulan selalu sinkron dengan aslinya.
+
+    Pantulan langit dan kota saja di-cache dan hanya kolom yang berubah
+    (Background.dirty) yang diperbarui; tiap frame
+    hanya kolom `span` (tempat ada kembang api di pita yang dipantulkan)
+    yang diperkecil dan diredupkan ulang dari layar.
+    """
+
+    def __init__(self):
+        self.top = int(WATERLINE_Y)
+        self.water_h = SCREEN_HEIGHT - self.top
+        self.sky_h = min(self.top, int(self.water_h / REFLECTION_SQUASH))
+        self.buffer = None
+        # Baris ke-y di air mengambil baris dari bawah buffer (dicerminkan)
+        self.rows = [pygame.Rect(0, self.water_h - 1 - y, SCREEN_WIDTH, 1)
+                     for y in range(self.water_h)]
+        depth = np.arange(1, self.water_h + 1) / self.water_h
+        self.ripple_phase = depth * 40
+        self.ripple_amplitude = RIPPLE_AMPLITUDE * depth  # Riak makin kuat menjauhi garis air
+        dim = int(255 * REFLECTION_DIM)
+        self.dim_color = (dim, dim, dim)
+        self.static = self.scratch = None
+
+    @property
+    def band(self):
+        """Baris layar (y0, y1) yang dipantulkan ke air."""
+        return self.top - self.sky_h, self.top
+
+    def _reflect(self, source, dest, x0=0, x1=SCREEN_WIDTH):
+        """Memperkecil kolom x0..x1 pita `source` ke `dest` lalu meredupkannya.
+
+        Skala horizontal 1:1, jadi pemetaan barisnya sama dengan skala penuh.
+        """
+        strip = source.subsurface((x0, self.top - self.sky_h, x1 - x0, self.sky_h))
+        pygame.transform.scale(strip, (x1 - x0, self.water_h), dest.subsurface((x0, 0, x1 - x0, self.water_h)))
+        dest.fill(self.dim_color, (x0, 0, x1 - x0, self.water_h), special_flags=pygame.BLEND_MULT)
+
+    def _update_static(self, background):
+        if self.static is None:
+            self.static = pygame.Surface((SCREEN_WIDTH, self.water_h), 0, background.sky)
+            self.scratch = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, background.sky)
+        city_h = background.city_layer.get_height()
+        for x0, x1 in background.dirty:
+            x0, x1 = max(0, x0), min(SCREEN_WIDTH, x1)
+            if x1 <= x0:
+                continue
+            self.scratch.blit(background.sky, (x0, 0), (x0, 0, x1 - x0, SCREEN_HEIGHT))
+            self.scratch.blit(background.city_layer, (x0, background.city_top), (x0, 0, x1 - x0, city_h))
+            self._reflect(self.scratch, self.static, x0, x1)
+        background.dirty.clear()
+
+    def draw(self, surface, time, background=None, span=(0, SCREEN_WIDTH)):
+        """Tanpa `background` seluruh pita dipantulkan ulang dari layar setiap frame."""
+        if self.buffer is None:
+            self.buffer = pygame.Surface((SCREEN_WIDTH, self.water_h), 0, surface)
+        if background is None:
+            self._reflect(surface, self.buffer)
+        else:
+            if background.dirty:
+                self._update_static(background)
+            self.buffer.blit(self.static, (0, 0))
+            if span is not None:
+                x0, x1 = max(0, int(span[0])), min(SCREEN_WIDTH, int(math.ceil(span[1])))
+                if x1 > x0:
+                    self._reflect(surface, self.buffer, x0, x1)
+        offsets = (np.sin(time / RIPPLE_SPEED + self.ripple_phase)
+                   * self.ripple_amplitude).astype(np.int64).tolist()
+        surface.blits([(self.buffer, (dx, self.top + y), row, pygame.BLEND_ADD)
+                       for y, (dx, row) in enumerate(zip(offsets, self.rows))], doreturn=False)
+
+
+class TrailLayer:
+    """Lapisan persisten untuk asap roket dan ekor bintang jatuh.
+
+    Roket dan bintang jatuh hanya menggoreskan garis dari posisi sebelumnya
+    ke posisi sekarang. Setiap langkah simulasi isi lapisan diredupkan dengan
+    satu blit BLEND_MULT (plus BLEND_SUB kecil agar benar-benar habis), lalu
+    lapisan ditambahkan (BLEND_ADD) di atas latar. Lapisan berhenti di garis
+    air; pantulannya dibuat WaterReflection. Biayanya tetap berapa pun
+    jumlah jejaknya, dan hanya area yang pernah digores (`rect`) disentuh.
+    Peredupnya berupa surface konstan karena blit blend memakai jalur SIMD,
+    sedangkan fill dengan flag yang sama ~25x lebih lambat.
+    """
+
+    def __init__(self, fade=TRAIL_FADE, floor=TRAIL_FADE_FLOOR):
+        self.fade_level, self.floor = round(255 * fade), floor
+        self.layer = self.mult = self.sub = None  # Dibuat saat goresan pertama
+        self.rect = None  # Area yang mungkin masih berisi jejak
+        self.idle = 0
+        # Langkah sampai piksel paling terang pasti hitam lagi
+        self.lifetime, level = 0, 255
+        while level > 0:
+            level = max(0, ((level * self.fade_level + 255) >> 8) - floor)
+            self.lifetime += 1
+
+    def _build(self):
+        size = (SCREEN_WIDTH, int(WATERLINE_Y))
+        self.layer, self.mult, self.sub = (pygame.Surface(size) for _ in range(3))
+        self.mult.fill((self.fade_level,) * 3)
+        self.sub.fill((self.floor,) * 3)
+
+    def stamp(self, start, end, color, width=1):
+        if self.layer is None:
+            self._build()
+        rect = pygame.draw.line(self.layer, color, start, end, width)
+        if rect:  # Kosong bila garis seluruhnya di luar lapisan
+            self.rect = rect if self.rect is None else self.rect.union(rect)
+            self.idle = 0
+
+    def fade(self):
+        """Dipanggil sekali per langkah simulasi, sebelum goresan baru."""
+        if self.rect is None:
+            return
+        self.idle += 1
+        if self.idle >= self.lifetime:
+            self.rect = None  # Semua sudah hitam; area mulai dari nol lagi
+            return
+        self.layer.blit(self.mult, self.rect, self.rect, pygame.BLEND_MULT)
+        self.layer.blit(self.sub, self.rect, self.rect, pygame.BLEND_SUB)
+
+    def draw(self, surface):
+        if self.rect is not None:
+            surface.blit(self.layer, self.rect, self.rect, pygame.BLEND_ADD)
+
+    def clear(self):
+        if self.layer is not None:
+            self.layer.fill(0)
+        self.rect = None
+
+
+TRAILS = TrailLayer()
+
+
+class GlowLayer:
+    """Mode render 'glow': percikan dijumlahkan aditif ke buffer beresolusi rendah.
+
+    Cahaya percikan diakumulasi di array 1/scale layar (SPARKS.splat),
+    disalin ke buffer, diberi bloom murah, lalu hanya area yang berisi
+    percikan yang di-upscale halus (smoothscale) dan ditambahkan
+    (BLEND_ADD) di atas latar dan kota. Bloom memakai transform.gaussian_blur
+    bila ada (pygame-ce), selain itu perkecil-perbesar dengan smoothscale.
+    """
+
+    def __init__(self, scale=None, bloom=None):
+        self.scale = scale or GLOW_SCALE
+        self.bloom = GLOW_BLOOM if bloom is None else bloom
+        size = (-(-SCREEN_WIDTH // self.scale), -(-SCREEN_HEIGHT // self.scale))
+        self.buffer = pygame.Surface(size)
+        self.light = np.zeros((*size, 3), dtype=np.float32)
+        level = int(255 * self.bloom)
+        self.bloom_color = (level, level, level)
+
+    @staticmethod
+    def _blur(region):
+        gaussian_blur = getattr(pygame.transform, 'gaussian_blur', None)
+        if gaussian_blur is not None:
+            return gaussian_blur(region, GLOW_BLUR)
+        w, h = region.get_size()
+        small = pygame.transform.smoothscale(region, (max(1, w // GLOW_BLUR), max(1, h // GLOW_BLUR)))
+        return pygame.transform.smoothscale(small, (w, h))
+
+    def draw(self, surface, alpha=1.0):
+        self.light.fill(0)
+        area = SPARKS.splat(self.light, self.scale, alpha)
+        if area is None:
+            return
+        area = area.inflate(4 * GLOW_BLUR, 4 * GLOW_BLUR).clip(self.buffer.get_rect())
+        x, y, w, h = area
+        np.minimum(self.light[x:x + w, y:y + h], 255, out=self.light[x:x + w, y:y + h])
+        pygame.surfarray.blit_array(self.buffer, self.light.astype(np.uint8))
+        region = self.buffer.subsurface(area)
+        if self.bloom:
+            blurred = self._blur(region)
+            blurred.fill(self.bloom_color, special_flags=pygame.BLEND_MULT)
+            region.blit(blurred, (0, 0), special_flags=pygame.BLEND_ADD)
+        upscaled = pygame.transform.smoothscale(region, (area.w * self.scale, area.h * self.scale))
+        surface.blit(upscaled, (area.x * self.scale, area.y * self.scale), special_flags=pygame.BLEND_ADD)
 
 
 def draw_help_text(surface, auto_fire, next_type, is_typing, finale_active):
@@ -453,113 +1773,1068 @@ def draw_help_text(surface, auto_fire, next_type, is_typing, finale_active):
     elif is_typing:
         text_to_show = "Ketik pesan, tekan ENTER..."
     if text_to_show:
-        surf = HELP_FONT.render(text_to_show, True, GOLD)
+        surf = FONTS.help.render(text_to_show, True, GOLD)
         surface.blit(surf, (SCREEN_WIDTH/2 - surf.get_width()/2, y))
         return
 
     controls = [f"[A] Auto-Launch: {'ON' if auto_fire else 'OFF'}", "[P]eony [W]illow [R]ing [H]eart [M]ulti",
-                f"Berikutnya: {next_type.capitalize()}", "[T] Ganti Teks | [F] Grand Finale"]
+                f"Berikutnya: {next_type.capitalize()}", "[T] Ganti Teks | [F] Grand Finale | [G] Glow"]
     for i, line in enumerate(controls):
         color = GOLD if f"[{next_type[0].upper()}]" in line else WHITE
-        surface.blit(HELP_FONT.render(line, True, color), (10, y + i * 22))
+        surface.blit(FONTS.help.render(line, True, color), (10, y + i * 22))
+
+# --- Timeline Pertunjukan ---
+Cue = collections.namedtuple('Cue', 'time kind pos color text')
+CUE_KINDS = ('text', 'finale', 'auto')  # Selain jenis kembang api di BURST_TEMPLATES
+
+
+def parse_timestamp(text):
+    """'75.5', '1:15.5' atau '0:01:15.5' -> milidetik."""
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds * 1000
+
+
+def parse_cue(line, timed=True):
+    """Satu baris timeline -> Cue. Kolom yang tidak dipakai ditulis '-'.
+
+    Dengan timed=False baris tidak punya kolom waktu (perintah server
+    kontrol) dan Cue.time berisi None.
+    """
+    columns = 6 if timed else 5
+    fields = line.split(None, columns - 1)
+    fields += ['-'] * (columns - len(fields))
+    time, kind, x, y, color, text = fields if timed else [None, *fields]
+    if kind not in BURST_TEMPLATES and kind not in CUE_KINDS:
+        raise ValueError(f"jenis cue tidak dikenal: {kind!r}")
+    if kind == 'text' and text == '-':
+        raise ValueError("cue text butuh pesan")
+    pos = None if x == '-' else (float(x), None if y == '-' else float(y))
+    if color != '-':
+        color = color.lstrip('#')
+        color = tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return Cue(None if time is None else parse_timestamp(time), kind, pos, None if color == '-' else color,
+               None if text == '-' else text)
+
+
+def read_timeline(path):
+    """Membaca file timeline baris demi baris sebagai generator Cue.
+
+    Format: satu cue per baris, kolom dipisah spasi; baris kosong dan
+    baris yang diawali '#' diabaikan. Teks boleh berisi spasi.
+
+        # waktu    jenis   x    y    warna    teks
+        0:00.0     peony   -    -    -
+        0:01.5     heart   500  200  #ff1493
+        # roket diluncurkan dari x=300
+        0:02.0     willow  300  -    -
+        0:12       text    -    -    -        Selamat Tahun Baru
+        1:00       finale
+        # auto-fire dinyalakan/dimatikan
+        1:20       auto
+
+    Jenis adalah nama template di BURST_TEMPLATES, 'text', 'finale', atau 'auto'.
+    Dengan x dan y kembang api langsung meledak di titik itu; dengan x
+    saja roket diluncurkan dari x; tanpa posisi roket diluncurkan acak.
+    """
+    with open(path, encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                yield parse_cue(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: {e}") from None
+
+
+class TimelineScheduler:
+    """Mengeluarkan cue dari stream saat waktunya tiba.
+
+    Cue dibaca dari iterator hanya sampai `lookahead_ms` di depan waktu
+    sekarang dan ditampung di heap, jadi timeline sepanjang apa pun tidak
+    pernah dimuat utuh, dan urutan di file boleh sedikit acak. Dipanggil
+    sekali per langkah simulasi, cue terlambat paling banyak satu langkah.
+    """
+
+    def __init__(self, cues, lookahead_ms=TIMELINE_LOOKAHEAD_MS):
+        self._cues = iter(cues)
+        self._heap = []
+        self._seq = itertools.count()  # Pemecah seri agar cue sewaktu tetap berurutan
+        self._read_until = -math.inf
+        self.lookahead_ms = lookahead_ms
+        self.exhausted = False
+        self.fired = 0
+
+    def _fill(self, horizon):
+        while not self.exhausted and self._read_until <= horizon:
+            cue = next(self._cues, None)
+            if cue is None:
+                self.exhausted = True
+                break
+            heapq.heappush(self._heap, (cue.time, next(self._seq), cue))
+            self._read_until = max(self._read_until, cue.time)
+
+    def due(self, time):
+        """Menghasilkan semua cue dengan waktu <= `time`, urut waktu."""
+        self._fill(time + self.lookahead_ms)
+        while self._heap and self._heap[0][0] <= time:
+            self.fired += 1
+            yield heapq.heappop(self._heap)[2]
+
+    def done(self):
+        return self.exhausted and not self._heap
+
+
+# --- Server Kontrol ---
+def parse_control_address(address):
+    """'/tmp/kembangapi.sock' -> ('unix', path); '127.0.0.1:7777', ':7777' atau '7777' -> ('tcp', host, port)."""
+    if os.sep in address or address.endswith('.sock'):
+        return ('unix', address)
+    host, _, port = address.rpartition(':') if ':' in address else ('', '', address)
+    if not port.isdigit():
+        host, port = address, CONTROL_DEFAULT_PORT
+    host = host.strip('[]') or '127.0.0.1'
+    # Protokolnya tanpa autentikasi, jadi hanya boleh terbuka untuk mesin ini
+    try:
+        loopback = host == 'localhost' or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(f"server kontrol hanya boleh di localhost/loopback, bukan {host!r}")
+    return ('tcp', host, int(port))
+
+
+class ControlServer:
+    """Server asyncio di thread latar yang menerima perintah untuk pertunjukan.
+
+    Protokolnya baris teks dengan format cue timeline tanpa kolom waktu
+    (lihat read_timeline), mis. "peony 500 200 #ff1493", "finale",
+    "text - - - Halo", "auto". Satu kiriman boleh berisi banyak baris; semuanya
+    diurai di thread server lalu dimasukkan ke `commands`, deque yang
+    append/popleft-nya atomik, jadi loop utama tidak pernah menunggu lock.
+    Baris yang salah dibalas "error <pesan>"; yang benar tidak dibalas.
+    """
+
+    def __init__(self, address, queue_size=CONTROL_QUEUE_SIZE):
+        self.address = parse_control_address(address)
+        self.commands = collections.deque(maxlen=queue_size)
+        self.received = self.rejected = 0
+        self._loop = None
+        self._server = None
+        self.error = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name='control', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        try:
+            if self.address[0] == 'unix':
+                if os.path.exists(self.address[1]):
+                    os.unlink(self.address[1])  # Sisa proses sebelumnya
+                self._server = await asyncio.start_unix_server(self._handle, self.address[1])
+            else:
+                self._server = await asyncio.start_server(self._handle, *self.address[1:])
+        except OSError as e:
+            self.error = e  # Dilempar ulang oleh start() di thread utama
+            return
+        finally:
+            self._ready.set()
+        async with self._server:
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        pending, skipping = b'', False
+        while data := await reader.read(CONTROL_READ_SIZE):
+            *lines, pending = (pending + data).split(b'\n')
+            if skipping and lines:
+                lines, skipping = lines[1:], False  # Ekor baris yang terlalu panjang
+            if len(pending) > CONTROL_MAX_LINE:
+                if not skipping:
+                    lines.append(pending)  # Ditolak di bawah; sisanya dilewati
+                pending, skipping = b'', True
+            # Baris panjang bisa juga tiba utuh (dengan newline) dalam satu pembacaan
+            accepted = [line for line in lines if len(line) <= CONTROL_MAX_LINE]
+            errors = [f"error baris lebih dari {CONTROL_MAX_LINE} byte\n"] * (len(lines) - len(accepted))
+            await self._accept(accepted, errors, writer)
+        if pending and not skipping:
+            # Perintah terakhir tanpa newline sebelum koneksi ditutup
+            await self._accept([pending], [], writer)
+        writer.close()
+
+    async def _accept(self, lines, errors, writer):
+        """Mengurai satu batch baris ke `commands`; baris yang salah dibalas."""
+        batch = []
+        for line in lines:
+            line = line.decode('utf-8', 'replace').strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                batch.append(parse_cue(line, timed=False))
+            except ValueError as e:
+                errors.append(f"error {e}\n")
+        self.commands.extend(batch)
+        self.received += len(batch)
+        if errors:
+            self.rejected += len(errors)
+            writer.write(''.join(errors).encode())
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+
+    def stop(self):
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._thread.join(timeout=1)
+            if self.address[0] == 'unix':
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self.address[1])
+
+
+def control_load_test(address, rate=5000, seconds=5.0, batch=50):
+    """Klien uji beban: mengirim `rate` perintah acak per detik dalam batch."""
+    async def run():
+        target = parse_control_address(address)
+        if target[0] == 'unix':
+            reader, writer = await asyncio.open_unix_connection(target[1])
+        else:
+            reader, writer = await asyncio.open_connection(*target[1:])
+        kinds = list(BURST_TEMPLATES)
+        sent, start = 0, perf_counter()
+        while (elapsed := perf_counter() - start) < seconds:
+            # Kirim sejumlah perintah yang seharusnya sudah terkirim sampai saat ini
+            due = min(int(elapsed * rate) - sent, batch)
+            if due <= 0:
+                await asyncio.sleep(batch / rate / 4)
+                continue
+            lines = [f"{random.choice(kinds)} {random.randint(0, SCREEN_WIDTH)} "
+                     f"{random.randint(50, SCREEN_HEIGHT // 2)}\n" for _ in range(due)]
+            writer.write(''.join(lines).encode())
+            await writer.drain()
+            sent += due
+        elapsed = perf_counter() - start
+        writer.close()
+        await writer.wait_closed()
+        return sent, elapsed
+
+    sent, elapsed = asyncio.run(run())
+    print(f"{sent} perintah dalam {elapsed:.2f} s ({sent / elapsed:.0f}/s)")
+
+
+# --- Profiler ---
+class _TimingScope:
+    """Context manager yang menambahkan durasinya ke total frame scope `name`."""
+
+    __slots__ = ('totals', 'name', 'start')
+
+    def __init__(self, totals, name):
+        self.totals, self.name = totals, name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.totals[self.name] += (perf_counter() - self.start) * 1000
+
+
+class Profiler:
+    """Scope waktu bernama, penghitung bergulir, overlay HUD dan file trace.
+
+    Selama overlay mati dan tidak merekam trace, scope() hanya
+    mengembalikan satu nullcontext bersama, jadi biayanya nyaris nol.
+    Setiap frame yang dirender ditutup dengan end_frame(): total tiap scope
+    dan penghitung masuk ke jendela PROFILE_WINDOW frame terakhir (untuk
+    p50/p99 dan rata-rata) dan, bila merekam, satu baris di file trace
+    (.csv, atau JSON untuk ekstensi lain).
+    """
+
+    _NULL_SCOPE = contextlib.nullcontext()
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.enabled = self.overlay = False
+        self.totals = dict.fromkeys(PROFILE_SCOPES, 0.0)
+        self._scopes = {name: _TimingScope(self.totals, name) for name in PROFILE_SCOPES}
+        self.history = {name: collections.deque(maxlen=window)
+                        for name in ('frame_ms', *PROFILE_SCOPES, *PROFILE_COUNTERS)}
+        self.counters = dict.fromkeys(PROFILE_COUNTERS, 0)
+        self.frames = 0
+        self._trace = self._trace_writer = None
+        self.trace_rows = 0
+        self._panel = None
+        self._last_frame = self._last_alloc = self._last_gc = None
+
+    def scope(self, name):
+        return self._scopes[name] if self.enabled else self._NULL_SCOPE
+
+    def _update_enabled(self):
+        was_enabled, self.enabled = self.enabled, self.overlay or self._trace is not None
+        if self.enabled and not was_enabled:
+            for name in self.totals:
+                self.totals[name] = 0.0
+            self._last_frame = perf_counter()
+            self._last_alloc, self._last_gc = self._allocations(), GC_MONITOR.collections
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self._panel = None
+        self._update_enabled()
+
+    def start_trace(self, path):
+        self._trace = open(path, 'w', newline='')
+        self.trace_rows = 0  # Per trace; `frames` terus bertambah sejak awal
+        if path.endswith('.csv'):
+            self._trace_writer = csv.writer(self._trace)
+            self._trace_writer.writerow(['frame', *self.history])
+        else:
+            self._trace.write('[')
+            self._trace_writer = None
+        self._update_enabled()
+
+    def stop_trace(self):
+        if self._trace is None:
+            return
+        if self._trace_writer is None:
+            self._trace.write('\n]\n')
+        self._trace.close()
+        self._trace = None
+        self._update_enabled()
+
+    @staticmethod
+    def _allocations():
+        """Objek dan sprite baru sejak awal; selisihnya per frame = alokasi per frame."""
+        return sum(pool.allocated for pool in ENTITY_POOLS.values()) + SPRITES.misses
+
+    def end_frame(self, counters):
+        now = perf_counter()
+        allocations, gc_count = self._allocations(), GC_MONITOR.collections
+        self.counters.update(counters)
+        self.counters['allocations'] = allocations - self._last_alloc
+        self.counters['gc_collections'] = gc_count - self._last_gc
+        self._last_alloc, self._last_gc = allocations, gc_count
+        row = {'frame_ms': (now - self._last_frame) * 1000, **self.totals, **self.counters}
+        self._last_frame = now
+        for name, value in row.items():
+            self.history[name].append(value)
+            if name in self.totals:
+                self.totals[name] = 0.0
+        if self._trace is not None:
+            if self._trace_writer is not None:
+                self._trace_writer.writerow([self.frames, *(row[name] for name in self.history)])
+            else:
+                self._trace.write(('\n' if self.trace_rows == 0 else ',\n') + json.dumps({'frame': self.frames, **row}))
+            self.trace_rows += 1
+        self.frames += 1
+        if self.frames % PROFILE_HUD_REFRESH == 0:
+            self._panel = None
+
+    def summary(self):
+        """p50/p99 waktu frame, rata-rata tiap scope, dan penghitung terakhir."""
+        frame_ms = self.history['frame_ms']
+        if not frame_ms:
+            return {}
+        p50, p99 = np.percentile(frame_ms, (50, 99))
+        return {
+            'frame_ms_p50': float(p50), 'frame_ms_p99': float(p99),
+            'scopes_ms': {name: statistics.fmean(self.history[name]) for name in PROFILE_SCOPES},
+            'counters': dict(self.counters),
+        }
+
+    def _build_panel(self):
+        summary = self.summary()
+        if not summary:
+            return None
+        lines = [f"frame p50 {summary['frame_ms_p50']:5.1f} ms  p99 {summary['frame_ms_p99']:5.1f} ms  "
+                 f"({1000 / max(summary['frame_ms_p50'], 1e-3):.0f} fps)"]
+        lines += [f"{name:<22}{ms:6.2f} ms" for name, ms in summary['scopes_ms'].items() if ms >= 0.005]
+        lines += [f"{name:<22}{value:6d}" for name, value in summary['counters'].items()]
+        rendered = [FONTS.help.render(line, True, WHITE) for line in lines]
+        height = sum(r.get_height() for r in rendered)
+        panel = pygame.Surface((max(r.get_width() for r in rendered) + 16, height + 16))
+        panel.fill((10, 10, 30))
+        panel.set_alpha(200)
+        y = 8
+        for r in rendered:
+            panel.blit(r, (8, y))
+            y += r.get_height()
+        return panel
+
+    def draw(self, surface):
+        if not self.overlay:
+            return
+        with self.scope('hud'):
+            if self._panel is None:
+                self._panel = self._build_panel()
+            if self._panel is not None:
+                surface.blit(self._panel, (surface.get_width() - self._panel.get_width() - 10, 10))
+
+
+PROFILER = Profiler()
+
 
 # --- Loop Utama (main) ---
 
 
-def main():
-    fireworks, stars, shooting_stars = [], create_stars(250), []
-    city, text_particles = create_city(), []
-    user_text, current_text_message = "", DEFAULT_TEXT_MESSAGE
-    last_text_time, moon_pos = - \
-        TEXT_ANIMATION_INTERVAL, (SCREEN_WIDTH*0.8, SCREEN_HEIGHT*0.2)
-    auto_fire, is_typing, finale_active, finale_end_time = True, False, False, 0
-    next_firework_type = 'peony'
+class FireworkShow:
+    """State pertunjukan (kembang api, teks, finale) yang dijalankan oleh main().
 
-    running = True
-    while running:
-        time = pygame.time.get_ticks()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-                running = False
-            if is_typing:
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        is_typing = False
-                        current_text_message = user_text if user_text else DEFAULT_TEXT_MESSAGE
-                        user_text = ""
-                        text_particles = create_text_particles(
-                            current_text_message, MESSAGE_FONT)
-                        last_text_time = time
-                    elif event.key == pygame.K_BACKSPACE:
-                        user_text = user_text[:-1]
-                    else:
-                        user_text += event.unicode
+    Dipisah dari loop event agar bisa digerakkan juga oleh mode headless dan
+    benchmark tanpa membuka jendela.
+    """
+
+    def __init__(self):
+        SPARKS.clear()
+        self.fireworks, self.stars, self.shooting_stars = [], create_stars(250), []
+        # Medan kosong dibuat langsung: FONTS.message baru dimuat warm_caches() di thread latar
+        self.city, self.text_particles = create_city(), TextParticleField(())
+        self.user_text, self.current_text_message = "", DEFAULT_TEXT_MESSAGE
+        self.last_text_time = -TEXT_ANIMATION_INTERVAL
+        self.moon_pos = (SCREEN_WIDTH*0.8, SCREEN_HEIGHT*0.2)
+        self.background = Background(self.stars, self.moon_pos, self.city)
+        self.reflection = WaterReflection()
+        self.auto_fire, self.is_typing, self.finale_active, self.finale_end_time = True, False, False, 0
+        self.next_firework_type = 'peony'
+        self.render_mode, self.glow = RENDER_MODE, None
+        self.timeline = None
+        self.commands_run = 0  # Perintah server kontrol yang dijalankan frame ini
+        self.update_ms = 0.0  # Total waktu update sejak render terakhir
+
+    def launch(self, firework_type=None, pos=None, color=None, launch_x=None):
+        """Meluncurkan roket, atau langsung meledak di `pos` bila diberikan."""
+        firework_type = firework_type or self.next_firework_type
+        if pos is None:
+            self.fireworks.append(Firework.pool.acquire(
+                firework_type=firework_type, color=color, launch_x=launch_x))
+        else:
+            self.fireworks.append(Firework.pool.acquire(pos, firework_type, True, color=color))
+
+    def play_timeline(self, cues):
+        """Menjalankan cue (mis. dari read_timeline) relatif terhadap waktu 0 show."""
+        self.timeline = TimelineScheduler(cues)
+        self.auto_fire = False
+
+    def run_cue(self, cue, time):
+        if cue.kind == 'text':
+            self.show_text(cue.text, time)
+        elif cue.kind == 'finale':
+            self.start_finale(time)
+        elif cue.kind == 'auto':
+            self.auto_fire = not self.auto_fire
+        elif cue.pos is not None and cue.pos[1] is None:
+            self.launch(cue.kind, color=cue.color, launch_x=cue.pos[0])
+        else:
+            self.launch(cue.kind, cue.pos, cue.color)
+
+    def run_commands(self, commands, time, limit=CONTROL_MAX_PER_FRAME):
+        """Menjalankan perintah dari ControlServer; dipanggil sekali per frame."""
+        run = 0
+        while run < limit and commands:
+            self.run_cue(commands.popleft(), time)
+            run += 1
+        self.commands_run = run
+
+    def start_finale(self, time):
+        self.finale_active = True
+        self.finale_end_time = time + FINALE_DURATION
+
+    def show_text(self, message, time):
+        self.current_text_message = message if message else DEFAULT_TEXT_MESSAGE
+        self.text_particles = create_text_particles(
+            self.current_text_message, FONTS.message)
+        self.last_text_time = time
+
+    def handle_event(self, event, time):
+        if self.is_typing:
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_RETURN:
+                    self.is_typing = False
+                    self.show_text(self.user_text, time)
+                    self.user_text = ""
+                elif event.key == pygame.K_BACKSPACE:
+                    self.user_text = self.user_text[:-1]
+                else:
+                    self.user_text += event.unicode
+        else:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                self.launch(pos=event.pos)
+            if event.type == pygame.KEYDOWN:
+                key_map = {pygame.K_a: 'auto', pygame.K_p: 'peony', pygame.K_w: 'willow', pygame.K_r: 'ring',
+                           pygame.K_h: 'heart', pygame.K_m: 'multi', pygame.K_t: 'typing', pygame.K_f: 'finale', pygame.K_g: 'glow'}
+                action = key_map.get(event.key)
+                if action == 'auto':
+                    self.auto_fire = not self.auto_fire
+                elif action in ['peony', 'willow', 'ring', 'heart', 'multi']:
+                    self.next_firework_type = action
+                elif action == 'typing':
+                    self.is_typing = True
+                elif action == 'finale':
+                    self.start_finale(time)
+                elif action == 'glow':
+                    self.render_mode = 'sharp' if self.render_mode == 'glow' else 'glow'
+
+    def update(self, time):
+        start = perf_counter()
+        if self.timeline is not None:
+            for cue in self.timeline.due(time):
+                self.run_cue(cue, time)
+        if self.finale_active:
+            if time > self.finale_end_time:
+                self.finale_active = False
+            elif RANDOM.random() < FINALE_LAUNCH_RATE:
+                self.launch(RANDOM.choice(('peony', 'willow', 'ring', 'heart', 'multi')))
+        elif self.auto_fire and RANDOM.random() < AUTO_FIREWORK_CHANCE:
+            self.launch()
+        if RANDOM.random() < SHOOTING_STAR_CHANCE:
+            self.shooting_stars.append(ShootingStar.pool.acquire())
+
+        if not self.text_particles and time - self.last_text_time > TEXT_ANIMATION_INTERVAL and not self.is_typing:
+            self.show_text(self.current_text_message, time)
+
+        with PROFILER.scope('update.background'):
+            self.background.update()
+        with PROFILER.scope('update.trails'):
+            TRAILS.fade()
+        with PROFILER.scope('update.fireworks'):
+            update_and_sweep(self.fireworks)
+        with PROFILER.scope('update.sparks'):
+            SPARKS.update()
+        with PROFILER.scope('update.text'):
+            self.text_particles.update()
+        with PROFILER.scope('update.shooting_stars'):
+            update_and_sweep(self.shooting_stars)
+        self.update_ms += (perf_counter() - start) * 1000
+
+    def draw(self, surface, time, alpha=1.0):
+        """Menggambar state terakhir; `alpha` menginterpolasi posisi antar langkah."""
+        start = perf_counter()
+        with PROFILER.scope('draw.background'):
+            self.background.draw(surface, time)
+            TRAILS.draw(surface)
+        with PROFILER.scope('draw.fireworks'):
+            # Tidak ada culling per kembang api: percikan dibuang per percikan di
+            # integrate_sparks/SPARKS.draw, dan roket di Particle.sprite_blit
+            for fw in self.fireworks:
+                fw.draw(surface, alpha)
+        with PROFILER.scope('draw.sparks'):
+            if self.render_mode == 'glow':
+                if self.glow is None:
+                    self.glow = GlowLayer()
+                self.glow.draw(surface, alpha)
             else:
-                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    fireworks.append(
-                        Firework(event.pos, next_firework_type, True))
-                if event.type == pygame.KEYDOWN:
-                    key_map = {pygame.K_a: 'auto', pygame.K_p: 'peony', pygame.K_w: 'willow', pygame.K_r: 'ring',
-                               pygame.K_h: 'heart', pygame.K_m: 'multi', pygame.K_t: 'typing', pygame.K_f: 'finale'}
-                    action = key_map.get(event.key)
-                    if action == 'auto':
-                        auto_fire = not auto_fire
-                    elif action in ['peony', 'willow', 'ring', 'heart', 'multi']:
-                        next_firework_type = action
-                    elif action == 'typing':
-                        is_typing = True
-                    elif action == 'finale':
-                        finale_active = True
-                        finale_end_time = time + FINALE_DURATION
-
-        # --- Update Logic ---
-        if finale_active:
-            if time > finale_end_time:
-                finale_active = False
-            elif random.random() < FINALE_LAUNCH_RATE:
-                fireworks.append(Firework(firework_type=random.choice(
-                    ['peony', 'willow', 'ring', 'heart', 'multi'])))
-        elif auto_fire and random.random() < AUTO_FIREWORK_CHANCE:
-            fireworks.append(Firework(firework_type=next_firework_type))
-        if random.random() < SHOOTING_STAR_CHANCE:
-            shooting_stars.append(ShootingStar())
-
-        if not text_particles and time - last_text_time > TEXT_ANIMATION_INTERVAL and not is_typing:
-            text_particles = create_text_particles(
-                current_text_message, MESSAGE_FONT)
-            last_text_time = time
-
-        for group in [fireworks, text_particles, shooting_stars]:
-            [item.update() for item in group]
-        fireworks = [fw for fw in fireworks if not fw.is_done()]
-        text_particles = [tp for tp in text_particles if tp.is_alive()]
-        shooting_stars = [ss for ss in shooting_stars if ss.is_alive()]
-
-        # --- Drawing Logic ---
-        screen.fill((0, 0, 8))
-        draw_background_elements(screen, stars, moon_pos, city, shooting_stars)
-        for fw in fireworks:
-            fw.draw(screen)
-        for tp in text_particles:
-            tp.draw(screen)
-
-        if is_typing:
+                SPARKS.draw(surface, alpha)
+        if GOVERNOR.reflections:
+            with PROFILER.scope('draw.reflection'):
+                self.reflection.draw(surface, time, self.background, self.reflection_span())
+        with PROFILER.scope('draw.text'):
+            self.text_particles.draw(surface, alpha)
+        with PROFILER.scope('draw.ui'):
+            self.draw_ui(surface, time)
+        GOVERNOR.record(self.update_ms, (perf_counter() - start) * 1000,
+                        sum(self.particle_counts().values()))
+        self.update_ms = 0.0
+
+    def reflection_span(self):
+        """Rentang x konten dinamis di pita yang dipantulkan, atau None bila kosong."""
+        y0, y1 = self.reflection.band
+        spans = [SPARKS.span_x(y0, y1)]
+        trails = TRAILS.rect
+        if trails is not None and trails.bottom > y0 and trails.top < y1:
+            spans.append((trails.left, trails.right))
+        for fw in self.fireworks:
+            if not fw.exploded:
+                # Roket digambar di antara posisi langkah sebelumnya dan sekarang
+                rocket = fw.rocket
+                top, bottom = sorted((rocket.prev_pos.y, rocket.pos.y))
+                if bottom > y0 - CULL_MARGIN and top < y1 + CULL_MARGIN:
+                    spans.append((rocket.pos.x - CULL_MARGIN, rocket.pos.x + CULL_MARGIN))
+        spans = [s for s in spans if s is not None]
+        if not spans:
+            return None
+        return min(s[0] for s in spans), max(s[1] for s in spans)
+
+    def draw_ui(self, surface, time):
+        if self.is_typing:
             box_rect = pygame.Rect(
                 SCREEN_WIDTH * 0.1, SCREEN_HEIGHT/2 - 50, SCREEN_WIDTH * 0.8, 100)
-            pygame.draw.rect(screen, (20, 20, 40), box_rect)
-            pygame.draw.rect(screen, GOLD, box_rect, 2)
-            ts = INPUT_FONT.render(user_text, True, WHITE)
+            pygame.draw.rect(surface, (20, 20, 40), box_rect)
+            pygame.draw.rect(surface, GOLD, box_rect, 2)
+            ts = FONTS.input.render(self.user_text, True, WHITE)
             if (time // 500) % 2 == 0:
-                screen.blit(INPUT_FONT.render("_", True, WHITE),
-                            (box_rect.x+10+ts.get_width(), box_rect.y+25))
-            screen.blit(ts, (box_rect.x + 10, box_rect.y + 25))
-        draw_help_text(screen, auto_fire, next_firework_type,
-                       is_typing, finale_active)
-
-        pygame.display.flip()
-        clock.tick(FPS)
+                surface.blit(FONTS.input.render("_", True, WHITE),
+                             (box_rect.x+10+ts.get_width(), box_rect.y+25))
+            surface.blit(ts, (box_rect.x + 10, box_rect.y + 25))
+        draw_help_text(surface, self.auto_fire, self.next_firework_type,
+                       self.is_typing, self.finale_active)
+
+    def particle_counts(self):
+        """Jumlah partikel hidup per jenis, untuk benchmark."""
+        return {
+            'sparks': len(SPARKS),
+            'text': len(self.text_particles),
+        }
+
+    def profile_counters(self):
+        """Penghitung per frame untuk Profiler (hanya dipanggil bila profiler aktif)."""
+        counters = self.particle_counts()
+        counters['shooting_stars'] = len(self.shooting_stars)
+        counters['fireworks'] = len(self.fireworks)
+        counters['sub_explosions'] = sum(len(fw.sub_explosions) for fw in self.fireworks)
+        counters['commands'] = self.commands_run
+        return counters
+
+
+class FixedTimestep:
+    """Akumulator langkah tetap: simulasi maju SIM_DT_MS per langkah, render sebisanya.
+
+    Waktu dinding dikumpulkan lalu dibayar dalam langkah simulasi utuh,
+    paling banyak max_steps per iterasi loop. Bila masih tertinggal, render
+    dilewati (bukan langkahnya) sampai max_skipped kali berturut-turut;
+    setelah itu sisa tunggakan dibuang agar loop tidak terus mengejar.
+    Waktu simulasi selalu kelipatan SIM_DT_MS, jadi beberapa layar yang
+    mulai bersamaan tetap sinkron meski biaya gambarnya berbeda.
+    """
+
+    def __init__(self, dt_ms=SIM_DT_MS, max_steps=MAX_CATCH_UP_STEPS, max_skipped=MAX_SKIPPED_RENDERS):
+        self.dt_ms, self.max_steps, self.max_skipped = dt_ms, max_steps, max_skipped
+        self.steps = 0
+        self.accumulator = 0.0
+        self.skipped = 0
+        self.renders = self.renders_skipped = 0
+        self.dropped_ms = 0.0
+        self._last = None
+
+    @property
+    def sim_time(self):
+        return self.steps * self.dt_ms
+
+    @property
+    def alpha(self):
+        """Fraksi langkah berikutnya yang sudah lewat, untuk interpolasi render."""
+        return min(self.accumulator / self.dt_ms, 1.0)
+
+    def advance(self):
+        """Menghasilkan waktu simulasi untuk setiap langkah yang sudah jatuh tempo."""
+        now = perf_counter()
+        if self._last is not None:
+            self.accumulator += (now - self._last) * 1000
+        self._last = now
+        for _ in range(min(int(self.accumulator // self.dt_ms), self.max_steps)):
+            yield self.sim_time
+            self.steps += 1
+            self.accumulator -= self.dt_ms
+
+    def should_render(self):
+        """False bila render ini sebaiknya dilewati untuk mengejar simulasi."""
+        if self.accumulator >= self.dt_ms:
+            if self.skipped < self.max_skipped:
+                self.skipped += 1
+                self.renders_skipped += 1
+                return False
+            dropped = self.accumulator - self.accumulator % self.dt_ms
+            self.dropped_ms += dropped
+            self.accumulator -= dropped
+        self.skipped = 0
+        self.renders += 1
+        return True
+
+
+def warm_caches():
+    """Dijalankan di thread latar selagi frame pertama dirender."""
+    AUDIO.load()
+    text_targets(DEFAULT_TEXT_MESSAGE, FONTS.message)
+
+
+def main(timeline=None, trace=None, startup_only=False, control=None):
+    """Loop jendela. Dengan `startup_only`, keluar setelah frame pertama dan
+    mengembalikan waktu sejak proses mulai sampai frame itu tampil (ms).
+    Dengan `control` (alamat), perintah dari ControlServer ikut dijalankan."""
+    surface = init_display()
+    clock = pygame.time.Clock()
+    threading.Thread(target=warm_caches, name='warmup', daemon=True).start()
+    GC_MONITOR.install()
+    if trace:
+        PROFILER.start_trace(trace)
+    show = FireworkShow()
+    if timeline:
+        show.play_timeline(read_timeline(timeline))
+    server = ControlServer(control).start() if control else None
+    gc.freeze()  # Objek awal (cache, kota, bintang) tidak perlu dipindai GC lagi
+    timestep = FixedTimestep()
+    first_frame_ms = None
+    running = True
+    while running:
+        with PROFILER.scope('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    running = False
+                if event.type == pygame.KEYDOWN and event.key == PROFILE_KEY:
+                    PROFILER.toggle_overlay()
+                show.handle_event(event, timestep.sim_time)
+        if server is not None:
+            with PROFILER.scope('control'):
+                show.run_commands(server.commands, timestep.sim_time)
+
+        for time in timestep.advance():
+            with PROFILER.scope('update'):
+                show.update(time)
+        with PROFILER.scope('audio'):
+            AUDIO.flush()  # Sekali per frame, bukan per langkah: langkah susulan ikut digabung
+
+        if timestep.should_render():
+            with PROFILER.scope('draw'):
+                show.draw(surface, timestep.sim_time, timestep.alpha)
+            PROFILER.draw(surface)
+            with PROFILER.scope('flip'):
+                pygame.display.flip()
+            if first_frame_ms is None:
+                first_frame_ms = (perf_counter() - PROCESS_START) * 1000
+                running = not startup_only
+            if PROFILER.enabled:
+                PROFILER.end_frame(show.profile_counters())
+            clock.tick(FPS)
+    if server is not None:
+        server.stop()
+    PROFILER.stop_trace()
     pygame.quit()
+    return first_frame_ms
+
+
+# --- Mode Headless & Benchmark ---
+FRAME_MS = SIM_DT_MS  # Mode headless: satu render per langkah simulasi
+LONG_TEXT_MESSAGE = "Selamat Tahun Baru! Semoga Sukses Selalu"
+
+
+def seed_everything(seed):
+    """Menyamakan seed RANDOM, RENDER_RANDOM dan RNG NumPy agar simulasi bisa diulang."""
+    RANDOM.seed(seed)
+    RENDER_RANDOM.seed((seed, 1))
+    RNG.bit_generator.state = np.random.default_rng(seed).bit_generator.state
+    SPARKS.seed = seed
+
+
+def _scenario_auto(show, frame, n_launches=40, frames=600):
+    step = frames // n_launches
+    if frame % step == 0:
+        show.launch(['peony', 'willow', 'ring', 'heart', 'multi'][frame // step % 5])
+
+
+def _scenario_finale(show, frame):
+    if frame == 0:
+        show.start_finale(0)
+
+
+def _scenario_hearts(show, frame):
+    if frame < 300 and frame % 10 == 0:
+        show.launch('heart', (RANDOM.randint(150, SCREEN_WIDTH - 150),
+                              RANDOM.randint(100, int(SCREEN_HEIGHT * 0.45))))
+
+
+def _scenario_text(show, frame):
+    if frame == 0:
+        show.show_text(LONG_TEXT_MESSAGE, 0)
+
+
+# nama -> (jumlah frame, skrip per frame)
+BENCH_SCENARIOS = {
+    'auto': (600, _scenario_auto),
+    'finale': (int(FINALE_DURATION / FRAME_MS) + 240, _scenario_finale),
+    'hearts': (480, _scenario_hearts),
+    'text': (720, _scenario_text),
+}
+
+
+def headless_show(seed=0, governor=False, timeline=None):
+    """FireworkShow baru dengan semua state global di-reset ke `seed`."""
+    seed_everything(seed)
+    SPRITES.clear()
+    TRAILS.clear()
+    GOVERNOR.reset()
+    GOVERNOR.enabled = governor
+    for pool in ENTITY_POOLS.values():
+        pool.clear()
+    GC_MONITOR.install()
+    GC_MONITOR.reset()
+    show = FireworkShow()
+    show.auto_fire = False
+    if timeline:
+        show.play_timeline(read_timeline(timeline))
+    return show
+
+
+def run_headless(scenario='auto', seed=0, frames=None, surface=None, stats=None, governor=False,
+                 timeline=None):
+    """Menjalankan skenario dengan langkah waktu tetap, tanpa clock.tick.
+
+    DetailGovernor dimatikan secara default karena keputusannya bergantung
+    pada waktu mesin, sehingga hasilnya tidak lagi bisa diulang persis.
+    Dengan `timeline` (path file), scenario boleh None.
+    """
+    n_frames, script = BENCH_SCENARIOS[scenario] if scenario else (600, None)
+    frames = n_frames if frames is None else frames
+    surface = surface or pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    show = headless_show(seed, governor, timeline)
+    for frame in range(frames):
+        time = frame * FRAME_MS
+        if script:
+            script(show, frame)
+        t0 = perf_counter()
+        with PROFILER.scope('update'):
+            show.update(time)
+        t1 = perf_counter()
+        with PROFILER.scope('draw'):
+            show.draw(surface, time)
+        t2 = perf_counter()
+        if PROFILER.enabled:
+            PROFILER.end_frame(show.profile_counters())
+        if stats is not None:
+            stats['update_ms'].append((t1 - t0) * 1000)
+            stats['draw_ms'].append((t2 - t1) * 1000)
+            stats['particles'].append(sum(show.particle_counts().values()))
+    return show
+
+
+def raw_pixel_format(surface):
+    """Urutan byte piksel surface 32-bit dalam notasi -pix_fmt ffmpeg (mis. 'bgr0')."""
+    channels = {shift // 8: name for name, mask, shift in
+                zip('rgba', surface.get_masks(), surface.get_shifts()) if mask}
+    order = [channels.get(i, '0') for i in range(4)]
+    return ''.join(order if sys.byteorder == 'little' else reversed(order))
+
+
+class FrameWriter:
+    """Thread penulis frame untuk ekspor video.
+
+    Frame digambar di salah satu dari beberapa Surface yang bergiliran;
+    writer menulis buffer piksel Surface itu langsung (tanpa salinan) lalu
+    mengembalikannya ke antrean bebas. Karena jumlah Surface terbatas,
+    simulasi otomatis tertahan bila writer tertinggal lebih dari
+    `queue_size` frame. Format 'raw' menulis piksel 32-bit apa adanya ke
+    satu file (atau '-' untuk stdout), 'png' menulis frame_00000.png dst.
+    ke direktori `path`.
+    """
+
+    def __init__(self, path, fmt='raw', queue_size=EXPORT_QUEUE_SIZE, template=None):
+        size = template.get_size() if template else (SCREEN_WIDTH, SCREEN_HEIGHT)
+        depth = template if template and template.get_bytesize() == 4 else 32
+        self.path, self.fmt = path, fmt
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        for _ in range(queue_size):
+            self.free.put(pygame.Surface(size, 0, depth))
+        self.pixel_format = raw_pixel_format(self.free.queue[0])
+        self.written = 0
+        self.write_s = 0.0
+        self.error = None
+        if fmt == 'png':
+            os.makedirs(path, exist_ok=True)
+            self.out = None
+        else:
+            self.out = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        self.thread = threading.Thread(target=self._run, name='frame-writer', daemon=True)
+        self.thread.start()
+
+    def acquire(self):
+        """Surface kosong untuk frame berikutnya; menunggu bila writer tertinggal."""
+        if self.error is not None:
+            raise self.error
+        return self.free.get()
+
+    def submit(self, surface):
+        self.ready.put(surface)
+
+    def _run(self):
+        while True:
+            surface = self.ready.get()
+            if surface is None:
+                break
+            start = perf_counter()
+            try:
+                if self.error is None:
+                    self._write(surface)
+            except Exception as e:  # Dilaporkan ke thread utama lewat acquire()
+                self.error = e
+            self.write_s += perf_counter() - start
+            self.free.put(surface)
+
+    def _write(self, surface):
+        if self.fmt == 'png':
+            pygame.image.save(surface, os.path.join(self.path, f"frame_{self.written:05d}.png"))
+        else:
+            view = surface.get_view('0')
+            self.out.write(view)
+            del view  # Melepas lock Surface sebelum dipakai lagi
+        self.written += 1
+
+    def close(self):
+        self.ready.put(None)
+        self.thread.join()
+        if self.out is not None:
+            self.out.flush()
+            if self.out is not sys.stdout.buffer:
+                self.out.close()
+        if self.error is not None:
+            raise self.error
+
+
+def export_video(path, fmt='raw', scenario=None, seed=0, frames=None, timeline=None,
+                 queue_size=EXPORT_QUEUE_SIZE):
+    """Merender show secepat mungkin ke file video mentah atau urutan PNG.
+
+    Simulasi dan rasterisasi berjalan di thread utama, penulisan di
+    FrameWriter, jadi keduanya tumpang tindih. Tanpa `frames`, timeline
+    dirender sampai cue terakhir dan semua partikelnya habis (auto-fire
+    dimatikan setelah cue terakhir). Satu frame = satu langkah simulasi,
+    jadi videonya SIM_RATE fps.
+    """
+    n_frames, script = BENCH_SCENARIOS[scenario] if scenario else (600, None)
+    if frames is None and not (timeline and not scenario):
+        frames = n_frames
+    show = headless_show(seed, timeline=timeline)
+    writer = FrameWriter(path, fmt, queue_size)
+    sim_s = wait_s = 0.0
+    start = perf_counter()
+    try:
+        for frame in itertools.count():
+            if frames is not None and frame >= frames:
+                break
+            if frames is None and show.timeline.done():
+                show.auto_fire = False  # Kalau tidak, roket baru terus diluncurkan dan ekspor tak pernah selesai
+                if not (show.fireworks or len(SPARKS) or len(show.text_particles) or show.finale_active):
+                    break
+            t0 = perf_counter()
+            surface = writer.acquire()
+            t1 = perf_counter()
+            time = frame * FRAME_MS
+            if script:
+                script(show, frame)
+            show.update(time)
+            show.draw(surface, time)
+            writer.submit(surface)
+            wait_s += t1 - t0
+            sim_s += perf_counter() - t1
+    finally:
+        writer.close()
+    elapsed = perf_counter() - start
+    width, height = SCREEN_WIDTH, SCREEN_HEIGHT
+    print(f"ekspor {writer.written} frame dalam {elapsed:.1f} s = {writer.written / elapsed:.1f} fps  "
+          f"(simulasi+gambar {sim_s:.1f} s, tulis {writer.write_s:.1f} s, menunggu writer {wait_s:.1f} s)",
+          file=sys.stderr)
+    if fmt == 'raw':
+        print(f"ffmpeg -f rawvideo -pix_fmt {writer.pixel_format} -s {width}x{height} "
+              f"-r {SIM_RATE} -i {path} ...", file=sys.stderr)
+    return writer.written / elapsed
+
+
+def run_benchmark(scenarios=None, seed=0, json_path=None, governor=False):
+    """Mengukur waktu update/draw, jumlah partikel, dan memori puncak per skenario."""
+    results = {}
+    for name in scenarios or BENCH_SCENARIOS:
+        stats = {'update_ms': [], 'draw_ms': [], 'particles': []}
+        run_headless(name, seed, stats=stats, governor=governor)
+        pools = pool_stats()
+        # Memori diukur di putaran terpisah karena tracemalloc memperlambat waktu
+        tracemalloc.start()
+        run_headless(name, seed, governor=governor)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {
+            'frames': len(stats['update_ms']),
+            'update_ms': statistics.fmean(stats['update_ms']),
+            'update_ms_p95': float(np.percentile(stats['update_ms'], 95)),
+            'draw_ms': statistics.fmean(stats['draw_ms']),
+            'draw_ms_p95': float(np.percentile(stats['draw_ms'], 95)),
+            'particles_mean': statistics.fmean(stats['particles']),
+            'particles_peak': max(stats['particles']),
+            'peak_memory_mb': peak / 2**20,
+            'gc_collections': pools['gc']['collections'],
+            'gc_pause_ms_total': pools['gc']['pause_ms_total'],
+            'gc_pause_ms_max': pools['gc']['pause_ms_max'],
+            'objects_allocated': sum(pools[k]['allocated'] for k in ENTITY_POOLS),
+            'objects_reused': sum(pools[k]['reused'] for k in ENTITY_POOLS),
+        }
+        r = results[name]
+        print(f"{name:<8} update {r['update_ms']:7.2f} ms (p95 {r['update_ms_p95']:7.2f})  "
+              f"draw {r['draw_ms']:7.2f} ms (p95 {r['draw_ms_p95']:7.2f})  "
+              f"partikel {r['particles_mean']:8.0f} (puncak {r['particles_peak']})  "
+              f"memori {r['peak_memory_mb']:6.1f} MB  "
+              f"GC {r['gc_collections']}x (maks {r['gc_pause_ms_max']:.2f} ms)  "
+              f"objek baru {r['objects_allocated']} / dipakai ulang {r['objects_reused']}")
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({'seed': seed, 'results': results}, f, indent=2)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Kembang Api v5")
+    parser.add_argument('--headless', action='store_true',
+                        help="jalankan skenario tanpa jendela (driver video SDL dummy)")
+    parser.add_argument('--bench', action='store_true',
+                        help="jalankan semua skenario benchmark lalu laporkan hasilnya")
+    parser.add_argument('--scenario', choices=sorted(BENCH_SCENARIOS), action='append',
+                        help="skenario yang dijalankan (boleh diulang)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--frames', type=int, help="jumlah frame untuk --headless")
+    parser.add_argument('--json', help="simpan hasil benchmark ke file JSON")
+    parser.add_argument('--governor', action='store_true',
+                        help="aktifkan DetailGovernor di mode headless/benchmark")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="jumlah proses worker untuk simulasi percikan (0 = satu proses)")
+    parser.add_argument('--timeline', help="file timeline pertunjukan yang dijalankan")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="rekam timing profiler per frame ke file .csv atau .json")
+    parser.add_argument('--render', choices=RENDER_MODES, default=RENDER_MODE,
+                        help="mode render percikan ('glow' = lapisan aditif resolusi rendah)")
+    parser.add_argument('--glow-scale', type=int, choices=[1, 2, 4], default=GLOW_SCALE,
+                        help="faktor pengecilan lapisan glow (kualitas vs kecepatan)")
+    parser.add_argument('--startup', action='store_true',
+                        help="ukur waktu sampai frame pertama tampil, lalu keluar")
+    parser.add_argument('--export', metavar='PATH',
+                        help="render offline ke file video mentah ('-' = stdout) atau direktori PNG")
+    parser.add_argument('--export-format', choices=['raw', 'png'], default='raw')
+    parser.add_argument('--control', metavar='ADDR',
+                        help="terima perintah lewat socket Unix (path) atau TCP ([host:]port, bawaan 127.0.0.1)")
+    parser.add_argument('--control-load', type=int, metavar='RATE',
+                        help="uji beban: kirim RATE perintah/detik ke server --control selama 5 detik")
+    args = parser.parse_args(argv)
+    if args.control:
+        try:
+            parse_control_address(args.control)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    RENDER_MODE, GLOW_SCALE = args.render, args.glow_scale
+    if args.workers > 1:
+        SPARKS.set_backend(ParallelSimBackend(args.workers))
+        atexit.register(SPARKS.close)
+    if args.control_load:
+        control_load_test(args.control or str(CONTROL_DEFAULT_PORT), args.control_load)
+    elif args.export:
+        scenario = (args.scenario or [None if args.timeline else 'auto'])[0]
+        export_video(args.export, args.export_format, scenario, args.seed, args.frames, args.timeline)
+        pygame.quit()
+    elif args.bench:
+        run_benchmark(args.scenario, args.seed, args.json, args.governor)
+    elif args.headless:
+        if args.trace:
+            PROFILER.start_trace(args.trace)
+        for name in args.scenario or [None if args.timeline else 'auto']:
+            run_headless(name, args.seed, args.frames, governor=args.governor, timeline=args.timeline)
+        PROFILER.stop_trace()
+        pygame.quit()
+    elif args.startup:
+        print(f"frame pertama setelah {main(args.timeline, startup_only=True):.0f} ms")
+    else:
+        main(args.timeline, args.trace, control=args.control)
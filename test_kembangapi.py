@@ -0,0 +1,248 @@
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import pytest
+
+import kembangapi as ka
+
+
+class Owner:
+    """Pemilik percikan tiruan: cukup id, hitungan, dan pencatat event."""
+
+    _ids = iter(range(10**6, 10**7))
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.spark_count = 0
+        self.crackles = []
+
+    def on_crackle(self, pos):
+        self.crackles.append(pos)
+
+    def on_comet_burst(self, pos):
+        pass
+
+
+def single_spark(pos, vel, lifespan, state):
+    pool = ka.ParticlePool(capacity=4)
+    pool.spawn(Owner(), pos, np.array([vel], dtype=float), ka.WHITE, 2, lifespan, state=state)
+    return pool
+
+
+@pytest.mark.parametrize('state, code', [('burning', ka.STATE_BURNING), ('glitter', ka.STATE_GLITTER)])
+def test_integrate_sparks_matches_particle_update(state, code):
+    # Umur jauh dari ambang fading/crackle, jadi tidak ada langkah acak
+    particle = ka.Particle((300, 200), (2.5, -3.0), ka.WHITE, 2, 100, state=state)
+    pool = single_spark((300, 200), (2.5, -3.0), 100, code)
+
+    particle.update()
+    ka.integrate_sparks(pool.columns(), 0, 1, np.random.default_rng(0))
+
+    assert pool.pos[0] == pytest.approx((particle.pos.x, particle.pos.y))
+    assert pool.vel[0] == pytest.approx((particle.vel.x, particle.vel.y))
+    assert pool.prev_pos[0] == pytest.approx((300, 200))
+    assert pool.lifespan[0] == particle.lifespan
+    assert pool.state[0] == code
+
+
+def test_culled_sparks_stay_dead():
+    owner = Owner()
+    pool = ka.ParticlePool(capacity=1000)
+    n = 1000
+    vel = np.column_stack((np.full(n, -5.0), np.linspace(-3, 3, n)))
+    pool.spawn(owner, (-500, 200), vel, ka.WHITE, 2, 100, can_crackle=True)
+
+    pool.update()
+
+    assert len(pool) == 0
+    assert owner.crackles == []
+
+
+def test_particle_sprite_blit_interpolates():
+    particle = ka.Particle((100, 300), (0, -10), ka.WHITE, 3, ka.ROCKET_LIFESPAN, True)
+    particle.update()
+
+    (_, (_, full)), (_, (_, half)) = particle.sprite_blit(1.0), particle.sprite_blit(0.5)
+
+    # Naik 10 piksel dalam satu langkah: setengah langkah tertinggal 5 piksel
+    assert half - full == pytest.approx(5)
+
+
+class HalfBrokenExecutor:
+    """Executor tiruan: batch pertama dijalankan, batch berikutnya gagal."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        import concurrent.futures.process
+
+        future = concurrent.futures.Future()
+        self.submitted += 1
+        if self.submitted == 1:
+            future.set_result(fn(*args))
+        else:
+            future.set_exception(concurrent.futures.process.BrokenProcessPool('worker mati'))
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+def test_parallel_failure_steps_each_shard_once():
+    n = 3 * ka.SHARD_SIZE
+    vel = np.column_stack((np.linspace(-3, 3, n), np.full(n, -2.0)))
+    inline, parallel = ka.ParticlePool(capacity=n), ka.ParticlePool(capacity=n)
+    backend = ka.ParallelSimBackend(workers=2)
+    parallel.seed = inline.seed
+    parallel.set_backend(backend)
+    backend.executor = HalfBrokenExecutor()
+    try:
+        for pool in (inline, parallel):
+            pool.spawn(Owner(), (500, 300), vel, ka.WHITE, 2, 100)
+            pool.update()
+
+        assert not backend.available
+        assert np.array_equal(parallel.pos[:n], inline.pos[:n])
+        assert np.array_equal(parallel.vel[:n], inline.vel[:n])
+    finally:
+        parallel.close()
+
+
+def run_finale(draw_every, steps=300, seed=3):
+    surface = pygame.Surface((ka.SCREEN_WIDTH, ka.SCREEN_HEIGHT))
+    show = ka.headless_show(seed)
+    show.start_finale(0)
+    for step in range(steps):
+        show.update(step * ka.FRAME_MS)
+        if step % draw_every == 0:
+            show.draw(surface, step * ka.FRAME_MS)
+    return ka.SPARKS.pos[:len(ka.SPARKS)].copy()
+
+
+def test_render_count_does_not_change_simulation():
+    every_step, every_other_step = run_finale(1), run_finale(2)
+
+    assert len(every_step) > 0
+    assert np.array_equal(every_step, every_other_step)
+
+
+def test_show_update_moves_each_spark_one_step():
+    show = ka.headless_show(5)
+    show.launch('peony', pos=(500, 300))
+    n = len(ka.SPARKS)
+    pos, vel = ka.SPARKS.pos[:n].copy(), ka.SPARKS.vel[:n].copy()
+
+    show.update(0)
+
+    # Umur percikan peony jauh lebih dari satu langkah, jadi urutannya tetap
+    assert n > 0 and len(ka.SPARKS) == n
+    assert np.allclose(ka.SPARKS.pos[:n], pos + vel)
+
+
+def test_read_timeline_docstring_example_parses(tmp_path):
+    doc = ka.read_timeline.__doc__
+    example = doc[doc.index('# waktu'):doc.index('Jenis adalah')]
+    path = tmp_path / 'show.txt'
+    path.write_text(example, encoding='utf-8')
+
+    cues = list(ka.read_timeline(path))
+
+    assert [cue.kind for cue in cues] == ['peony', 'heart', 'willow', 'text', 'finale', 'auto']
+    assert cues[2].pos == (300.0, None)
+    assert cues[3].text == 'Selamat Tahun Baru'
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('7777', ('tcp', '127.0.0.1', 7777)),
+    ('localhost', ('tcp', 'localhost', ka.CONTROL_DEFAULT_PORT)),
+    ('127.0.0.2:9000', ('tcp', '127.0.0.2', 9000)),
+    ('[::1]:9000', ('tcp', '::1', 9000)),
+    ('/tmp/kembangapi.sock', ('unix', '/tmp/kembangapi.sock')),
+])
+def test_parse_control_address(address, expected):
+    assert ka.parse_control_address(address) == expected
+
+
+@pytest.mark.parametrize('address', ['0.0.0.0:7777', '192.168.1.5:7777', 'example.com'])
+def test_parse_control_address_rejects_non_loopback(address):
+    with pytest.raises(ValueError):
+        ka.parse_control_address(address)
+
+
+def test_background_dirty_spans_stay_bounded():
+    show = ka.headless_show(0)
+    show.draw(pygame.Surface((ka.SCREEN_WIDTH, ka.SCREEN_HEIGHT)), 0)
+    background = show.background
+
+    for _ in range(20000):  # Tanpa draw pantulan, tidak ada yang mengosongkan dirty
+        background.update()
+
+    assert len(background.dirty) <= background.MAX_DIRTY_SPANS
+
+
+def test_firework_show_does_not_load_the_message_font():
+    fonts = ka.FONTS
+    ka.FONTS = ka.FontSet()
+    try:
+        ka.FireworkShow()
+        assert 'message' not in vars(ka.FONTS)
+    finally:
+        ka.FONTS = fonts
+
+
+def send_to_control_server(tmp_path, *chunks):
+    import socket
+
+    server = ka.ControlServer(str(tmp_path / 'control.sock')).start()
+    try:
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(server.address[1])
+        for chunk in chunks:
+            client.sendall(chunk)
+        client.shutdown(socket.SHUT_WR)
+        client.settimeout(2)
+        replies = b''
+        while data := client.recv(4096):
+            replies += data
+        client.close()  # EOF dari server: koneksi sudah selesai diurai
+        return [cue.kind for cue in server.commands], replies
+    finally:
+        server.stop()
+
+
+def test_control_server_keeps_last_line_without_newline(tmp_path):
+    kinds, replies = send_to_control_server(tmp_path, b'peony 100 100\nfinale')
+
+    assert kinds == ['peony', 'finale']
+    assert replies == b''
+
+
+@pytest.mark.parametrize('split', [True, False])
+def test_control_server_rejects_overlong_line(tmp_path, split):
+    line = b'text - - - ' + b'x' * (ka.CONTROL_MAX_LINE * 3)
+    chunks = (line, b'\nfinale\n') if split else (line + b'\nfinale\n',)
+    kinds, replies = send_to_control_server(tmp_path, *chunks)
+
+    assert kinds == ['finale']
+    assert replies.startswith(b'error')
+
+
+def test_profiler_json_trace_is_valid_after_earlier_frames(tmp_path):
+    import json
+
+    profiler = ka.Profiler()
+    profiler.toggle_overlay()
+    profiler.end_frame({})  # Frame sebelum trace dimulai
+    for n in range(2):
+        path = tmp_path / f'trace{n}.json'
+        profiler.start_trace(str(path))
+        profiler.end_frame({})
+        profiler.end_frame({})
+        profiler.stop_trace()
+
+        assert [row['frame'] for row in json.loads(path.read_text())] == [1 + 2 * n, 2 + 2 * n]